@@ -16,6 +16,7 @@ class AbstractAdaptive(object):
 
     """
     __metaclass__ = ABCMeta
+    __slots__ = ()
 
     @abstractmethod
     def __iter__(self):
@@ -0,0 +1,200 @@
+import numpy as np
+
+from .StoppingRules import MaxReversals, MaxTrials, MinTrials, ThresholdSE, reversal_se
+
+
+class PsychometricObserver(object):
+    def __init__(self, threshold, slope=3.5, guess_rate=0.5, lapse_rate=0.02, seed=None):
+        """
+        Simulated 2AFC participant with Weibull psychometric function:
+        p(corr) = guess_rate + (1 - guess_rate - lapse_rate) * (1 - exp(-(level / threshold) ** slope))
+
+        * :param **threshold**: Threshold (scalar, or array with one value per simulated observer).
+        * :param **slope**: Weibull slope (scalar or array).
+        * :param **guess_rate**: Chance level, 0.5 for 2AFC.
+        * :param **lapse_rate**: Prob of error independent of level.
+        * :param **seed**: Random generator seed.
+        """
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.slope = np.asarray(slope, dtype=np.float64)
+        self.guess_rate = guess_rate
+        self.lapse_rate = lapse_rate
+        self.rng = np.random.default_rng(seed)
+
+    def p_corr(self, level):
+        level = np.maximum(np.asarray(level, dtype=np.float64), 0)
+        weibull = 1 - np.exp(-(level / self.threshold) ** self.slope)
+        return self.guess_rate + (1 - self.guess_rate - self.lapse_rate) * weibull
+
+    def level_for(self, p):
+        """
+        Inverse of psychometric function, level at which observer answers correctly with prob **p**.
+        """
+        weibull = (p - self.guess_rate) / (1 - self.guess_rate - self.lapse_rate)
+        return self.threshold * (-np.log(1 - weibull)) ** (1 / self.slope)
+
+    def answer(self, level):
+        """
+        :return: Bool array of answers correctness for given levels.
+        """
+        return self.rng.random(np.shape(level)) < self.p_corr(level)
+
+
+def convergence_p(n_up, n_down):
+    """
+    Prob of correct answer at which N-up/N-down staircase is stable (Levitt, 1971): run of n_up correct answers
+    is as probable to come first as run of n_down incorrect ones, e.g. 0.794 for 3-up/1-down.
+    """
+    def run_first(p):  # prob that n_up correct in a row comes before n_down incorrect in a row
+        q = 1 - p
+        a, b = p ** (n_up - 1), q ** (n_down - 1)
+        return a * (1 - q ** n_down) / (a + b - a * b)
+
+    lo, hi = 1e-9, 1 - 1e-9
+    for _ in range(60):  # bisection, run_first grows with p
+        p = (lo + hi) / 2
+        if run_first(p) < 0.5:
+            lo = p
+        else:
+            hi = p
+    return (lo + hi) / 2
+
+
+class BatchState(object):
+    """
+    Counters of all simulated staircases, arrays read by StoppingRule.done() like attributes of single procedure.
+    """
+    __slots__ = ('idx', 'revs_count', 'rev_used', 'rev_sum', 'rev_sq_sum')
+
+    def __init__(self, n_sims):
+        self.idx = 0
+        self.revs_count = np.zeros(n_sims, dtype=np.int64)
+        self.rev_used = np.zeros(n_sims, dtype=np.int64)
+        self.rev_sum = np.zeros(n_sims, dtype=np.float64)
+        self.rev_sq_sum = np.zeros(n_sims, dtype=np.float64)
+
+    @property
+    def threshold_se(self):
+        return reversal_se(self.rev_used, self.rev_sum, self.rev_sq_sum)
+
+
+class BatchNUpNDownMinIters(object):
+    def __init__(self, n_sims, n_up=3, n_down=1, max_revs=8, start_val=10, step_up=1, step_down=1, min_iters=100,
+                 max_iters=None, discard_revs=0, target_se=None, stop_rule=None):
+        """
+        **n_sims** independent NUpNDownMinIters state machines advanced at once, state is kept in NumPy arrays.
+        Rules are exactly the same as in NUpNDownMinIters, see there for params description.
+
+        * :param **n_sims**: No of simulated staircases.
+        * :param **max_iters**: Optional hard limit of trials (like MAX_TRIALS in main), None means no limit.
+        * :param **discard_revs**: No of first reversals not used in threshold estimate.
+        * :param **target_se**: Optional ThresholdSE target, staircase ends (after min_iters) when SE of its
+                                threshold estimate is not greater.
+        * :param **stop_rule**: StoppingRule used instead of one built from max_revs, min_iters, max_iters and
+                                target_se.
+        """
+        assert all(map(lambda x: x > 0, [n_sims, n_up, n_down, max_revs, step_up, min_iters])), 'Illegal init value'
+        self.n_sims = n_sims
+        self.n_up = n_up
+        self.n_down = n_down
+        self.max_revs = max_revs
+        self.start_val = start_val
+        self.step_up = step_up
+        self.step_down = step_down
+        self.min_iters = min_iters
+        self.max_iters = max_iters
+        self.discard_revs = discard_revs
+        if stop_rule is None:
+            stop_rule = MaxReversals(max_revs) if target_se is None else MaxReversals(max_revs) | ThresholdSE(target_se)
+            stop_rule = MinTrials(min_iters, stop_rule)
+            if max_iters is not None:
+                stop_rule = stop_rule | MaxTrials(max_iters)
+        self.stop_rule = stop_rule
+
+    def run(self, observer):
+        """
+        Simulate all staircases until every one of them stops.
+        :param observer: PsychometricObserver, with threshold and slope scalars or arrays of n_sims length.
+        :return: Dict of n_sims long arrays:
+                 n_trials - trials run, revs - reversals reached, converged - max_revs reached,
+                 threshold - mean level at reversals (NaN if none used), true_threshold - level at convergence_p,
+                 bias - threshold - true_threshold.
+        """
+        n = self.n_sims
+        curr_val = np.full(n, self.start_val, dtype=np.float64)
+        no_corr = np.zeros(n, dtype=np.int64)
+        no_incorr = np.zeros(n, dtype=np.int64)
+        last_jump_dir = np.zeros(n, dtype=np.int8)
+        n_trials = np.zeros(n, dtype=np.int64)
+        state = BatchState(n)
+        revs_count = state.revs_count
+        active = np.ones(n, dtype=bool)
+
+        while True:
+            state.idx += 1
+            # __next__: check if it's time to stop alg.
+            active &= np.logical_not(self.stop_rule.done(state))
+            if not active.any():
+                break
+            n_trials[active] = state.idx
+            level = curr_val.copy()
+
+            # set_corr
+            corr = observer.answer(level) & active
+            incorr = ~corr & active
+            no_corr = np.where(corr, no_corr + 1, np.where(incorr, 0, no_corr))
+            no_incorr = np.where(incorr, no_incorr + 1, np.where(corr, 0, no_incorr))
+            jump = np.zeros(n, dtype=np.int8)
+            jump_up = active & (no_corr == self.n_up)
+            curr_val[jump_up] -= self.step_up
+            jump[jump_up] = 1
+            jump_down = active & (no_incorr == self.n_down)
+            curr_val[jump_down] += self.step_down
+            jump[jump_down] = -1
+
+            jumped = jump != 0
+            switch = jumped & (last_jump_dir != 0) & (jump != last_jump_dir)
+            revs_count += switch
+            last_jump_dir = np.where(jumped, jump, last_jump_dir)
+            no_corr[jumped] = 0
+            no_incorr[jumped] = 0
+            np.maximum(curr_val, 0, out=curr_val)  # vals smaller than 0 are not allowed
+
+            used = switch & (revs_count > self.discard_revs)
+            state.rev_sum += np.where(used, level, 0)
+            state.rev_sq_sum += np.where(used, level ** 2, 0)
+            state.rev_used += used
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            threshold = np.where(state.rev_used > 0, state.rev_sum / state.rev_used, np.nan)
+        true_threshold = np.broadcast_to(observer.level_for(convergence_p(self.n_up, self.n_down)), (n,))
+        return dict(n_trials=n_trials, revs=revs_count, converged=revs_count >= self.max_revs,
+                    threshold=threshold, true_threshold=true_threshold, bias=threshold - true_threshold)
+
+
+def summarize(results):
+    """
+    Distribution summary of BatchNUpNDownMinIters.run results.
+    """
+    bias = results['bias'][~np.isnan(results['bias'])]
+    return dict(convergence_rate=results['converged'].mean(),
+                trials_mean=results['n_trials'].mean(),
+                trials_p5_p50_p95=np.percentile(results['n_trials'], [5, 50, 95]),
+                revs_mean=results['revs'].mean(),
+                bias_mean=bias.mean() if len(bias) else np.nan,
+                bias_sd=bias.std() if len(bias) else np.nan,
+                bias_p5_p50_p95=np.percentile(bias, [5, 50, 95]) if len(bias) else np.nan)
+
+
+if __name__ == '__main__':
+    import time
+
+    # cmp_freq settings, 100k observers with thresholds spread around 5 Hz
+    sims = BatchNUpNDownMinIters(n_sims=100000, n_up=3, n_down=1, max_revs=14, start_val=8, step_up=1, step_down=1,
+                                 min_iters=200, max_iters=160)
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    res = sims.run(PsychometricObserver(threshold=rng.uniform(2, 8, sims.n_sims), seed=1))
+    print(f'{time.perf_counter() - start:.2f} s')
+    for name, val in summarize(res).items():
+        print(name, val)
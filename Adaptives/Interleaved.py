@@ -0,0 +1,101 @@
+import random
+
+from .AbstractAdaptive import AbstractAdaptive
+
+RANDOM = 'random'
+ROUND_ROBIN = 'round_robin'
+
+
+class Interleaved(AbstractAdaptive):
+    """
+    Several adaptive procedures (tracks) run in one session, e.g. two staircases from opposite starting points.
+    Every iteration returns value of one track, chosen randomly or in round-robin order, set_corr() goes to
+    this same track (curr_track). Track is dropped when it ends, whole procedure ends with last track.
+
+    Usage:
+
+    ```
+    proc = Interleaved({'high': NUpNDown(start_val=40), 'low': NUpNDown(start_val=2)})
+    for val in proc:
+        ... calculations with val, proc.curr_track says which track it came from ...
+        proc.set_corr(...)
+    ```
+    """
+    __slots__ = ('tracks', 'order', 'seed', 'active', 'curr_track', 'rr_pos', 'idx', 'set_corr_flag')
+
+    def __init__(self, tracks, order=RANDOM, seed=None):
+        """
+        * :param **tracks**: Dict track name -> AbstractAdaptive, round-robin goes in dict order.
+        * :param **order**: RANDOM or ROUND_ROBIN.
+        * :param **seed**: Seed of random track choice, random by default. Choice depends only on seed and
+                           iteration no, so it's this same after restore().
+        """
+        assert len(tracks) > 0 and order in (RANDOM, ROUND_ROBIN), 'Illegal init value'
+        self.tracks = dict(tracks)
+        self.order = order
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+        self.active = list(self.tracks)
+        self.curr_track = None
+        self.rr_pos = 0
+        self.idx = 0
+        self.set_corr_flag = True
+
+    def _choose(self):
+        if self.order == ROUND_ROBIN:
+            names = list(self.tracks)
+            while names[self.rr_pos % len(names)] not in self.active:
+                self.rr_pos += 1
+            name = names[self.rr_pos % len(names)]
+            self.rr_pos += 1
+            return name
+        return random.Random(f'{self.seed}:{self.idx}:{len(self.active)}').choice(self.active)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        # Set_corr wasn't used after last iteration. That's quite bad.
+        if not self.set_corr_flag:
+            raise Exception(" class.set_corr() must be used at least once in any iteration!")
+        self.idx += 1
+        while self.active:
+            name = self._choose()
+            try:
+                val = next(self.tracks[name])
+            except StopIteration:
+                self.active.remove(name)
+                continue
+            self.curr_track = name
+            self.set_corr_flag = False
+            return val
+        raise StopIteration()
+
+    def set_corr(self, corr):
+        """
+        Pass correctness in last iteration to track which returned value.
+
+        :param **corr**: Correctness in last iteration.
+
+        :return: None
+        """
+        self.set_corr_flag = True
+        self.tracks[self.curr_track].set_corr(corr)
+
+    def get_jump_status(self):
+        return self.tracks[self.curr_track].get_jump_status()
+
+    def snapshot(self):
+        """
+        :return: Tuple (idx, set_corr_flag, curr_track, rr_pos, active tracks, seed, dict name -> track snapshot).
+        """
+        return (self.idx, self.set_corr_flag, self.curr_track, self.rr_pos, list(self.active), self.seed,
+                {name: track.snapshot() for name, track in self.tracks.items()})
+
+    def restore(self, state):
+        """
+        Set state taken with snapshot(), tracks must be built with this same names and params.
+        """
+        self.idx, self.set_corr_flag, self.curr_track, self.rr_pos, active, self.seed, tracks = state
+        self.active = list(active)
+        for name, track_state in tracks.items():
+            self.tracks[name].restore(track_state)
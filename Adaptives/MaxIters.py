@@ -1,5 +1,24 @@
-from AbstractAdaptive import AbstractAdaptive
+from .StoppingRules import MaxTrials, with_rule
+from .UpDownCore import UpDownCore
 
 
-class MaxIters(AbstractAdaptive):
-    pass
+class MaxIters(UpDownCore):
+    __slots__ = ('max_iters',)
+
+    def __init__(self, n_up=3, n_down=1, start_val=10, step_up=1, step_down=1, max_iters=100, stop_rule=None):
+        """
+        N-up/N-down staircase, see NUpNDown, with fixed length: algorithm will be terminated after **max_iters**
+        iterations, no matter how many swipes were detected.
+
+        * :param **n_up**: No of set_corr(True) before inc value.
+        * :param **n_down**: No of set_corr(False) before dec value.
+        * :param **start_val**: Initial value.
+        * :param **step_up**: Values of inc with n_up.
+        * :param **step_down**: Values of dec with n_down.
+        * :param **max_iters**: No of iterations before end of alg.
+        * :param **stop_rule**: Additional StoppingRule, e.g. ThresholdSE, algorithm ends when any rule says so.
+        """
+        assert max_iters > 0, 'Illegal init value'
+        super().__init__(n_up=n_up, n_down=n_down, max_revs=None, start_val=start_val, step_up=step_up,
+                         step_down=step_down, stop_rule=with_rule(MaxTrials(max_iters), stop_rule))
+        self.max_iters = max_iters
@@ -1,5 +1,27 @@
-from AbstractAdaptive import AbstractAdaptive
+from .StoppingRules import MaxTrials, max_reversals, with_rule
+from .UpDownCore import UpDownCore
 
 
-class NUpNDownMaxIters(AbstractAdaptive):
-    pass
\ No newline at end of file
+class NUpNDownMaxIters(UpDownCore):
+    __slots__ = ('max_iters',)
+
+    def __init__(self, n_up=3, n_down=1, max_revs=8, start_val=10, step_up=1, step_down=1, max_iters=100,
+                 stop_rule=None):
+        """
+        N-up/N-down staircase, see NUpNDown. Algorithm will be terminated after **max_revs** swipes,
+        or after **max_iters** iterations, whatever comes first.
+
+        * :param **n_up**: No of set_corr(True) before inc value.
+        * :param **n_down**: No of set_corr(False) before dec value.
+        * :param **max_revs**: No of swipes before end of alg, None if only iterations (and **stop_rule**) end it.
+        * :param **start_val**: Initial value.
+        * :param **step_up**: Values of inc with n_up.
+        * :param **step_down**: Values of dec with n_down.
+        * :param **max_iters**: Maximal no of iterations, even if max_revs wasn't reached.
+        * :param **stop_rule**: Additional StoppingRule, algorithm ends when any rule says so.
+        """
+        assert max_iters > 0, 'Illegal init value'
+        super().__init__(n_up=n_up, n_down=n_down, max_revs=max_revs, start_val=start_val, step_up=step_up,
+                         step_down=step_down,
+                         stop_rule=with_rule(with_rule(MaxTrials(max_iters), max_reversals(max_revs)), stop_rule))
+        self.max_iters = max_iters
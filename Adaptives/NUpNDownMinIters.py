@@ -1,10 +1,12 @@
-import warnings
+from .StoppingRules import MaxReversals, MinTrials, with_rule
+from .UpDownCore import UpDownCore
 
-from .AbstractAdaptive import AbstractAdaptive
 
+class NUpNDownMinIters(UpDownCore):
+    __slots__ = ('min_iters',)
 
-class NUpNDownMinIters(AbstractAdaptive):
-    def __init__(self, n_up=3, n_down=1, max_revs=8, start_val=10, step_up=1, step_down=1, min_iters=100):
+    def __init__(self, n_up=3, n_down=1, max_revs=8, start_val=10, step_up=1, step_down=1, min_iters=100,
+                 stop_rule=None):
         """
         This class will be returning some value in any iteration.
         At start it will be **start_val**.
@@ -17,97 +19,17 @@ class NUpNDownMinIters(AbstractAdaptive):
 
         * :param **n_up**: No of set_corr(True) before inc value.
         * :param **n_down**: No of set_corr(False) before dec value.
-        * :param **max_revs**: No of swipes before end of alg.
+        * :param **max_revs**: No of swipes before end of alg, None if only **stop_rule** ends it.
         * :param **start_val**: Initial value.
         * :param **step_up**: Values of inc with n_up.
         * :param **step_down**: Values of dec with n_down.
         * :param **min_iters**: Minimal no of iterations, even if max_revs will be reached, procedure will continue
                                 until min_iters iteration.
+        * :param **stop_rule**: Additional StoppingRule, e.g. MaxTrials, algorithm ends when any rule says so.
         """
-
-        # Some vals must be positive, check if that true.
-        assert all(map(lambda x: x > 0, [n_up, n_down, max_revs, step_up, min_iters])), 'Illegal init value'
-        self.n_up = n_up
-        self.n_down = n_down
-        self.max_revs = max_revs
-        self.curr_val = start_val
-        self.step_up = step_up
-        self.step_down = step_down
+        assert min_iters > 0, 'Illegal init value'
+        super().__init__(n_up=n_up, n_down=n_down, max_revs=max_revs, start_val=start_val, step_up=step_up,
+                         step_down=step_down,
+                         stop_rule=with_rule(None if max_revs is None else MinTrials(min_iters, MaxReversals(max_revs)),
+                                             stop_rule))
         self.min_iters = min_iters
-
-        self.idx = 0
-        self.jumps = 0
-        self.no_corr_in_a_row = 0
-        self.no_incorr_in_a_row = 0
-        self.last_jump_dir = 0
-        self.revs_count = 0
-        self.set_corr_flag = True
-        self.switch_in_last_trail_flag = False
-
-    def __iter__(self):
-        return self
-
-    def __next__(self):
-        # Set_corr wasn't used after last iteration. That's quite bad.
-        if not self.set_corr_flag:
-            raise Exception(" class.set_corr() must be used at least once in any iteration!")
-        self.set_corr_flag = False
-        self.idx += 1
-        # check if it's time to stop alg.
-        if (self.revs_count < self.max_revs) or (self.idx <= self.min_iters):
-            return self.curr_val
-        else:
-            # pass
-            raise StopIteration()
-
-    def set_corr(self, corr):
-        """
-        This func determine changes in value returned by next.
-
-        :param **corr**: Correctness in last iteration.
-
-        :return: None
-        """
-        # check if corr val make sense
-        assert isinstance(corr, bool), 'Correctness must be a boolean value'
-
-        self.set_corr_flag = True  # set_corr are used, set flag.
-        self.switch_in_last_trail_flag = False
-        jump = 0
-
-        # increase no of corr or incorr ans in row.
-        if corr:
-            self.no_corr_in_a_row += 1
-            self.no_incorr_in_a_row = 0
-        else:
-            self.no_corr_in_a_row = 0
-            self.no_incorr_in_a_row += 1
-
-        # check if it's time to change returned value
-        if self.n_up == self.no_corr_in_a_row:
-            self.curr_val -= self.step_up
-            jump = 1  # mean increase
-
-        if self.n_down == self.no_incorr_in_a_row:
-            self.curr_val += self.step_down
-            jump = -1  # mean decrease
-
-        if jump:  # check if jump was also a switch
-            if not self.last_jump_dir:
-                # it was first jump, remember direction.
-                self.last_jump_dir = jump
-            elif jump != self.last_jump_dir:
-                # yes, it was switch.
-                self.revs_count += 1
-                self.last_jump_dir = jump
-                self.switch_in_last_trail_flag = True
-            # clear counters after jump
-            self.no_incorr_in_a_row = 0
-            self.no_corr_in_a_row = 0
-
-        if self.curr_val < 0:  # vals smaller than 0 are not allowed
-            warnings.warn("SOA less than 0 after calculation. Set to 0.", UserWarning)
-            self.curr_val = 0
-
-    def get_jump_status(self):
-        return self.last_jump_dir, self.switch_in_last_trail_flag, self.revs_count
@@ -0,0 +1,164 @@
+import numpy as np
+
+from .AbstractAdaptive import AbstractAdaptive
+from .StoppingRules import MaxTrials, with_rule
+
+EPS = 1e-12  # probs are kept in [EPS, 1 - EPS], so p * log(p) is finite with lapse_rate (or guess_rate) = 0
+
+
+class Psi(AbstractAdaptive):
+    """
+    Bayesian adaptive procedure (Psi method, Kontsevich & Tyler, 1999) for 2AFC Weibull psychometric function:
+    p(corr) = guess_rate + (1 - guess_rate - lapse_rate) * (1 - exp(-(level / threshold) ** slope))
+
+    Posterior over (threshold, slope) grid is updated by multiplying it by row of likelihood table, precomputed
+    for every level. Next level is the one with minimal expected posterior entropy, which reduces to two
+    products of precomputed (levels, grid) tables with posterior, so both steps stay far below 1 ms with fine grids.
+    Snapshot of state is list of answers so far, posterior is rebuilt from it by restore().
+    """
+    __slots__ = ('levels', 'thresholds', 'slopes', 'max_iters', 'posterior', 'history', 'curr_idx', 'idx',
+                 'set_corr_flag', 'stop_rule', '_p_corr', '_p_incorr', '_neg_entropy', '_grid_thresholds',
+                 '_grid_slopes', '_prior')
+
+    def __init__(self, levels, thresholds=None, slopes=None, guess_rate=0.5, lapse_rate=0.02, max_iters=60,
+                 prior=None, stop_rule=None):
+        """
+        * :param **levels**: Possible stimulus levels (e.g. SOA values), returned values are taken from it.
+        * :param **thresholds**: Threshold grid, 100 values spread evenly up to max of levels by default.
+        * :param **slopes**: Slope grid, 20 log-spaced values 0.5..10 by default.
+        * :param **guess_rate**: Chance level, 0.5 for 2AFC.
+        * :param **lapse_rate**: Prob of error independent of level.
+        * :param **max_iters**: No of iterations before end of alg.
+        * :param **prior**: Prior over (thresholds, slopes) grid, uniform by default.
+        * :param **stop_rule**: Additional StoppingRule, e.g. MinTrials(20, ThresholdSE(0.5)), algorithm ends when
+                                any rule says so.
+        """
+        assert len(levels) > 0 and max_iters > 0, 'Illegal init value'
+        self.levels = list(levels)
+        levels = np.asarray(self.levels, dtype=np.float64)
+        assert thresholds is not None or levels.max() > 0, 'Default threshold grid needs positive levels'
+        self.thresholds = np.linspace(levels.max() / 100, levels.max(), 100) if thresholds is None else \
+            np.asarray(thresholds, dtype=np.float64)
+        self.slopes = np.geomspace(0.5, 10, 20) if slopes is None else np.asarray(slopes, dtype=np.float64)
+        self.max_iters = max_iters
+        self.stop_rule = with_rule(MaxTrials(max_iters), stop_rule)
+
+        # likelihood tables (levels, thresholds * slopes)
+        self._grid_thresholds = np.repeat(self.thresholds, len(self.slopes))
+        self._grid_slopes = np.tile(self.slopes, len(self.thresholds))
+        ratio = np.maximum(levels, 0)[:, None] / self._grid_thresholds[None, :]
+        self._p_corr = guess_rate + (1 - guess_rate - lapse_rate) * (1 - np.exp(-ratio ** self._grid_slopes))
+        np.clip(self._p_corr, EPS, 1 - EPS, out=self._p_corr)
+        self._p_incorr = 1 - self._p_corr
+        self._neg_entropy = self._p_corr * np.log(self._p_corr) + self._p_incorr * np.log(self._p_incorr)
+        prior = np.ones(len(self._grid_thresholds)) if prior is None else np.asarray(prior, dtype=np.float64).ravel()
+        self._prior = prior / prior.sum()
+
+        self.posterior = self._prior.copy()
+        self.history = list()
+        self.idx = 0
+        self.set_corr_flag = True
+        self.curr_idx = self._next_level()
+
+    def _next_level(self):
+        """
+        Index of level with minimal expected entropy of posterior after next answer. Terms constant over levels
+        are dropped: E[H] = p log p + (1 - p) log (1 - p) - posterior @ (L log L + (1 - L) log (1 - L)) + const,
+        where L is likelihood table and p prob of correct answer at given level.
+        """
+        p_corr = self._p_corr @ self.posterior
+        p_corr = np.clip(p_corr, EPS, 1 - EPS)
+        answer_neg_entropy = p_corr * np.log(p_corr) + (1 - p_corr) * np.log(1 - p_corr)
+        return int(np.argmin(answer_neg_entropy - self._neg_entropy @ self.posterior))
+
+    def _running(self):
+        """
+        Check if it's time to stop alg, called in every iteration after idx increment.
+        """
+        return not self.stop_rule.done(self)
+
+    @property
+    def threshold_se(self):
+        """
+        Posterior SD of threshold.
+        """
+        return self.get_estimates()[1]
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        # Set_corr wasn't used after last iteration. That's quite bad.
+        if not self.set_corr_flag:
+            raise Exception(" class.set_corr() must be used at least once in any iteration!")
+        self.set_corr_flag = False
+        self.idx += 1
+        if self._running():
+            return self.levels[self.curr_idx]
+        else:
+            raise StopIteration()
+
+    def _update(self, level_idx, corr):
+        self.posterior *= self._p_corr[level_idx] if corr else self._p_incorr[level_idx]
+        self.posterior /= self.posterior.sum()
+
+    def set_corr(self, corr):
+        """
+        Update posterior with answer to last returned level and choose next level.
+
+        :param **corr**: Correctness in last iteration.
+
+        :return: None
+        """
+        assert isinstance(corr, bool), 'Correctness must be a boolean value'
+        self.set_corr_flag = True
+        self.history.append((self.curr_idx, corr))
+        self._update(self.curr_idx, corr)
+        self.curr_idx = self._next_level()
+
+    def get_estimates(self):
+        """
+        :return: Posterior means and SDs: threshold, threshold_sd, slope, slope_sd.
+        """
+        threshold = self.posterior @ self._grid_thresholds
+        slope = self.posterior @ self._grid_slopes
+        threshold_sd = np.sqrt(max(self.posterior @ self._grid_thresholds ** 2 - threshold ** 2, 0))
+        slope_sd = np.sqrt(max(self.posterior @ self._grid_slopes ** 2 - slope ** 2, 0))
+        return float(threshold), float(threshold_sd), float(slope), float(slope_sd)
+
+    def snapshot(self):
+        """
+        :return: Tuple (idx, set_corr_flag, answers so far as (level index, corr) pairs).
+        """
+        return self.idx, self.set_corr_flag, tuple(self.history)
+
+    def restore(self, state):
+        """
+        Set state taken with snapshot(), posterior is rebuilt from answers, grid and levels are not changed.
+        """
+        self.idx, self.set_corr_flag, history = state
+        self.history = [(int(level_idx), bool(corr)) for level_idx, corr in history]
+        self.posterior = self._prior.copy()
+        for level_idx, corr in self.history:
+            self._update(level_idx, corr)
+        self.curr_idx = self._next_level()
+
+
+if __name__ == '__main__':
+    import time
+
+    from .BatchNUpNDownMinIters import PsychometricObserver
+
+    # cmp_freq like run, true threshold 5 Hz
+    observer = PsychometricObserver(threshold=5, seed=0)
+    psi = Psi(levels=range(0, 41), thresholds=np.linspace(0.2, 40, 200), slopes=np.geomspace(0.5, 10, 30),
+              max_iters=60)
+    times = list()
+    for level in psi:
+        answer = bool(observer.answer(level))
+        start = time.perf_counter()
+        psi.set_corr(answer)
+        times.append(time.perf_counter() - start)
+    print(f'grid: {len(psi.thresholds)}x{len(psi.slopes)}, levels: {len(psi.levels)}, '
+          f'set_corr median: {np.median(times) * 1000:.3f} ms, max: {np.max(times) * 1000:.3f} ms')
+    print('threshold, threshold_sd, slope, slope_sd:', psi.get_estimates())
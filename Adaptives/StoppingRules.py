@@ -0,0 +1,144 @@
+import numpy as np
+
+
+class StoppingRule(object):
+    """
+    Decides when adaptive procedure ends. Rule reads only counters kept by procedure (idx, revs_count,
+    threshold_se), so it is O(1) per trial. Rules are combined with | (any of them) and & (all of them).
+    Only &, | and comparisons are used, so this same rule works on scalar state of single procedure and on
+    array state of many procedures simulated at once (BatchNUpNDownMinIters).
+
+    Usage:
+
+    ```
+    rule = MinTrials(100, MaxReversals(12) | ThresholdSE(0.5)) | MaxTrials(300)
+    staircase = NUpNDown(..., stop_rule=rule)
+    ```
+    """
+    __slots__ = ()
+
+    def done(self, proc):
+        """
+        :param proc: Procedure (or batch state), called after idx increment of next iteration.
+        :return: True (or bool array) if procedure should end.
+        """
+        raise NotImplementedError
+
+    def __or__(self, other):
+        return AnyOf(self, other)
+
+    def __and__(self, other):
+        return AllOf(self, other)
+
+
+class MaxTrials(StoppingRule):
+    __slots__ = ('max_trials',)
+
+    def __init__(self, max_trials):
+        """
+        * :param **max_trials**: No of iterations after which procedure ends.
+        """
+        assert max_trials > 0, 'Illegal init value'
+        self.max_trials = max_trials
+
+    def done(self, proc):
+        return proc.idx > self.max_trials
+
+
+class MaxReversals(StoppingRule):
+    __slots__ = ('max_revs',)
+
+    def __init__(self, max_revs):
+        """
+        * :param **max_revs**: No of reversals after which procedure ends.
+        """
+        assert max_revs > 0, 'Illegal init value'
+        self.max_revs = max_revs
+
+    def done(self, proc):
+        return proc.revs_count >= self.max_revs
+
+
+class ThresholdSE(StoppingRule):
+    __slots__ = ('target_se',)
+
+    def __init__(self, target_se):
+        """
+        * :param **target_se**: Procedure ends when standard error of its threshold estimate is not greater.
+        """
+        assert target_se > 0, 'Illegal init value'
+        self.target_se = target_se
+
+    def done(self, proc):
+        return proc.threshold_se <= self.target_se
+
+
+class MinTrials(StoppingRule):
+    __slots__ = ('min_trials', 'rule')
+
+    def __init__(self, min_trials, rule):
+        """
+        * :param **min_trials**: Minimal no of iterations, **rule** can't end procedure before.
+        * :param **rule**: Gated rule.
+        """
+        assert min_trials > 0, 'Illegal init value'
+        self.min_trials = min_trials
+        self.rule = rule
+
+    def done(self, proc):
+        return (proc.idx > self.min_trials) & self.rule.done(proc)
+
+
+class AnyOf(StoppingRule):
+    __slots__ = ('rules',)
+
+    def __init__(self, *rules):
+        self.rules = rules
+
+    def done(self, proc):
+        done = self.rules[0].done(proc)
+        for rule in self.rules[1:]:
+            done = done | rule.done(proc)
+        return done
+
+
+class AllOf(StoppingRule):
+    __slots__ = ('rules',)
+
+    def __init__(self, *rules):
+        self.rules = rules
+
+    def done(self, proc):
+        done = self.rules[0].done(proc)
+        for rule in self.rules[1:]:
+            done = done & rule.done(proc)
+        return done
+
+
+def with_rule(rule, extra_rule=None):
+    """
+    :return: Rule ending procedure when **rule** or (optional) **extra_rule** says so, None if both are None.
+    """
+    if rule is None:
+        return extra_rule
+    return rule if extra_rule is None else rule | extra_rule
+
+
+def max_reversals(max_revs):
+    """
+    :return: MaxReversals(max_revs), None if **max_revs** is None (procedure doesn't end on reversals).
+    """
+    return None if max_revs is None else MaxReversals(max_revs)
+
+
+def reversal_se(n, total, sq_total, min_revs=3):
+    """
+    Standard error of mean of reversal levels, from their running count, sum and sum of squares.
+    Scalars or arrays, inf where there are fewer than **min_revs** reversals.
+    """
+    n = np.asarray(n, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var = (sq_total - total ** 2 / n) / (n - 1)
+        se = np.sqrt(np.maximum(var, 0) / n)
+    se = np.where(n >= min_revs, se, np.inf)
+    return float(se) if se.ndim == 0 else se
@@ -0,0 +1,143 @@
+import warnings
+
+from .AbstractAdaptive import AbstractAdaptive
+from .StoppingRules import MaxReversals, reversal_se
+
+
+class UpDownCore(AbstractAdaptive):
+    """
+    Shared compact core of N-up/N-down staircases. Subclasses define only when procedure ends (stop_rule).
+    State is kept in __slots__ (no instance __dict__), and whole mutable part of it can be taken and
+    put back as small tuple with snapshot()/restore(), e.g. to fork simulations or checkpoint session.
+    """
+    __slots__ = ('n_up', 'n_down', 'max_revs', 'step_up', 'step_down', 'curr_val', 'idx', 'jumps',
+                 'no_corr_in_a_row', 'no_incorr_in_a_row', 'last_jump_dir', 'revs_count', 'set_corr_flag',
+                 'switch_in_last_trail_flag', 'rev_sum', 'rev_sq_sum', 'stop_rule')
+    STATE = ('curr_val', 'idx', 'no_corr_in_a_row', 'no_incorr_in_a_row', 'last_jump_dir', 'revs_count',
+             'set_corr_flag', 'switch_in_last_trail_flag', 'rev_sum', 'rev_sq_sum')
+
+    def __init__(self, n_up=3, n_down=1, max_revs=8, start_val=10, step_up=1, step_down=1, stop_rule=None):
+        """
+        See NUpNDown for params description.
+
+        * :param **max_revs**: May be None, when procedure doesn't end on reversals (**stop_rule** is then required).
+        * :param **stop_rule**: StoppingRule, MaxReversals(max_revs) by default.
+        """
+        # Some vals must be positive, check if that true.
+        assert all(map(lambda x: x > 0, [n_up, n_down, step_up])), 'Illegal init value'
+        assert (max_revs is None and stop_rule is not None) or (max_revs is not None and max_revs > 0), \
+            'Illegal init value'
+        self.n_up = n_up
+        self.n_down = n_down
+        self.max_revs = max_revs
+        self.curr_val = start_val
+        self.step_up = step_up
+        self.step_down = step_down
+
+        self.idx = 0
+        self.jumps = 0
+        self.no_corr_in_a_row = 0
+        self.no_incorr_in_a_row = 0
+        self.last_jump_dir = 0
+        self.revs_count = 0
+        self.set_corr_flag = True
+        self.switch_in_last_trail_flag = False
+        self.rev_sum = 0  # running sum and sum of squares of levels at reversals, for threshold_se
+        self.rev_sq_sum = 0
+        self.stop_rule = MaxReversals(max_revs) if stop_rule is None else stop_rule
+
+    def _running(self):
+        """
+        Check if it's time to stop alg, called in every iteration after idx increment.
+        """
+        return not self.stop_rule.done(self)
+
+    @property
+    def threshold_se(self):
+        """
+        Standard error of reversal-mean threshold, inf below 3 reversals.
+        """
+        return reversal_se(self.revs_count, self.rev_sum, self.rev_sq_sum)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        # Set_corr wasn't used after last iteration. That's quite bad.
+        if not self.set_corr_flag:
+            raise Exception(" class.set_corr() must be used at least once in any iteration!")
+        self.set_corr_flag = False
+        self.idx += 1
+        # check if it's time to stop alg.
+        if self._running():
+            return self.curr_val
+        else:
+            raise StopIteration()
+
+    def set_corr(self, corr):
+        """
+        This func determine changes in value returned by next.
+
+        :param **corr**: Correctness in last iteration.
+
+        :return: None
+        """
+        # check if corr val make sense
+        assert isinstance(corr, bool), 'Correctness must be a boolean value'
+
+        self.set_corr_flag = True  # set_corr are used, set flag.
+        self.switch_in_last_trail_flag = False
+        level = self.curr_val
+        jump = 0
+
+        # increase no of corr or incorr ans in row.
+        if corr:
+            self.no_corr_in_a_row += 1
+            self.no_incorr_in_a_row = 0
+        else:
+            self.no_corr_in_a_row = 0
+            self.no_incorr_in_a_row += 1
+
+        # check if it's time to change returned value
+        if self.n_up == self.no_corr_in_a_row:
+            self.curr_val -= self.step_up
+            jump = 1  # mean increase
+
+        if self.n_down == self.no_incorr_in_a_row:
+            self.curr_val += self.step_down
+            jump = -1  # mean decrease
+
+        if jump:  # check if jump was also a switch
+            if not self.last_jump_dir:
+                # it was first jump, remember direction.
+                self.last_jump_dir = jump
+            elif jump != self.last_jump_dir:
+                # yes, it was switch.
+                self.revs_count += 1
+                self.last_jump_dir = jump
+                self.switch_in_last_trail_flag = True
+                self.rev_sum += level
+                self.rev_sq_sum += level ** 2
+            # clear counters after jump
+            self.no_incorr_in_a_row = 0
+            self.no_corr_in_a_row = 0
+
+        if self.curr_val < 0:  # vals smaller than 0 are not allowed
+            warnings.warn("SOA less than 0 after calculation. Set to 0.", UserWarning)
+            self.curr_val = 0
+
+    def get_jump_status(self):
+        return self.last_jump_dir, self.switch_in_last_trail_flag, self.revs_count
+
+    def snapshot(self):
+        """
+        :return: Tuple with whole mutable state, in STATE order.
+        """
+        return tuple(getattr(self, name) for name in self.STATE)
+
+    def restore(self, state):
+        """
+        Set state taken with snapshot(), procedure params (n_up, steps etc.) are not changed.
+        """
+        for name, val in zip(self.STATE, state):
+            setattr(self, name, val)
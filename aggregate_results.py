@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Compiles beh and triggermap CSVs of all sessions into one columnar dataset (Parquet or Feather, pandas with
+pyarrow needed), with session metadata (procedure, participant, session time) and config of the session
+(scalar params from conf/<PART_ID>_<ver>_config.yaml, as conf_<PARAM> columns) joined to every beh row.
+Aggregation is incremental: manifest keeps size and mtime of every parsed file, so only new or changed sessions
+are parsed (on process pool) and rows of removed ones are dropped.
+
+Example:
+    python aggregate_results.py --out results_dataset
+    python aggregate_results.py cmp_freq_results --out results_dataset --format feather
+"""
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from os.path import join
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import yaml
+
+RES_DIRS = ['cmp_dur_results', 'cmp_freq_results', 'cmp_vol_results']
+SESSION_FILE = re.compile(r'^(.*)_(\d{4}-\d{2}-\d{2}_\d{2}_\d{2}_\d{2})_(beh|triggermap)\.csv$')
+PART_ID = re.compile(r'^(.*)_(MALE|FEMALE)_(\d+)$')
+MANIFEST = 'manifest.json'
+
+BEH_TYPES = {'Trial': 'Int32', 'Proc_version': 'category', 'Exp': 'category', 'Key': 'category', 'Corr': 'boolean',
+             'SOA': 'float64', 'Reversal': 'Int8', 'Level': 'Int8', 'Rev_count': 'Int16', 'Lat': 'float64',
+             'Standard_first': 'boolean', 'Standard_higher': 'boolean', 'Track': 'category'}
+TRIGGER_TYPES = {'trigger_idx': 'Int32', 'trigger_no': 'Int16', 'trigger_type': 'category', 'corr': 'boolean',
+                 'key': 'category', 'send_time': 'float64'}
+SESSION_TYPES = {'source': 'string', 'procedure': 'category', 'session': 'string',
+                 'session_time': 'datetime64[ns, UTC]', 'PART_ID': 'string', 'name': 'string', 'sex': 'category',
+                 'age': 'Int16'}
+
+
+def session_info(path: str) -> Dict[str, object]:
+    """
+    Session metadata from results file path, <ver>_results/<beh|triggermaps>/<PART_ID>_<time>_<kind>.csv
+    """
+    res_dir = os.path.dirname(os.path.dirname(os.path.abspath(path)))
+    part_id, stamp, _ = SESSION_FILE.match(os.path.basename(path)).groups()
+    person = PART_ID.match(part_id)
+    name, sex, age = person.groups() if person else (part_id, None, None)
+    return dict(source=path, procedure=os.path.basename(res_dir).replace('_results', ''), session=f'{part_id}_{stamp}',
+                session_time=pd.to_datetime(stamp, format='%Y-%m-%d_%H_%M_%S', utc=True),  # names use UTC
+                PART_ID=part_id, name=name, sex=sex, age=age)
+
+
+def conf_path(path: str) -> Optional[str]:
+    """
+    Config copy of session of given beh file, None if there is none.
+    """
+    info = session_info(path)
+    conf_dir = join(os.path.dirname(os.path.dirname(path)), 'conf')
+    for fname in [f"{info['PART_ID']}_{info['procedure']}_config.yaml", f"{info['PART_ID']}_config.yaml"]:
+        if os.path.exists(join(conf_dir, fname)):
+            return join(conf_dir, fname)
+    return None
+
+
+def file_stat(path: Optional[str]) -> Optional[Tuple[int, int]]:
+    if path is None:
+        return None
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def parse_beh(path: str) -> pd.DataFrame:
+    """
+    Worker func, beh rows with session metadata and scalar config params.
+    """
+    beh = pd.read_csv(path, dtype=str, na_values=['-'], keep_default_na=False)
+    info = session_info(path)
+    for name in ['source', 'procedure', 'session', 'session_time', 'name', 'sex', 'age']:
+        beh[name] = info[name]
+    conf = conf_path(path)
+    if conf is not None:
+        with open(conf, 'r') as conf_file:
+            params = yaml.load(conf_file, Loader=yaml.SafeLoader) or dict()
+        for param, val in params.items():
+            if isinstance(val, (bool, int, float, str)):
+                beh[f'conf_{param}'] = val
+    return beh
+
+
+def parse_triggermap(path: str) -> pd.DataFrame:
+    """
+    Worker func, triggers (TriggerHandler log lines, starting with '#', are skipped) with session metadata.
+    """
+    triggers = pd.read_csv(path, dtype=str, comment='#', keep_default_na=False)
+    triggers.insert(0, 'trigger_idx', range(1, len(triggers) + 1))
+    info = session_info(path)
+    for name in ['source', 'procedure', 'session', 'session_time', 'PART_ID', 'name', 'sex', 'age']:
+        triggers[name] = info[name]
+    return triggers
+
+
+def set_types(table: pd.DataFrame, types: Dict[str, str]) -> pd.DataFrame:
+    types = {**SESSION_TYPES, **types}
+    for column, dtype in types.items():
+        if column not in table:
+            continue
+        if dtype == 'boolean':
+            table[column] = table[column].map({'True': True, 'False': False, '1': True, '0': False, True: True,
+                                               False: False, 1: True, 0: False}).astype(dtype)
+        elif dtype.startswith(('Int', 'float')):
+            table[column] = pd.to_numeric(table[column], errors='coerce').astype(dtype)
+        else:
+            table[column] = table[column].astype(dtype)
+    return table
+
+
+def read_table(path: str) -> Optional[pd.DataFrame]:
+    if not os.path.exists(path):
+        return None
+    return pd.read_feather(path) if path.endswith('.feather') else pd.read_parquet(path)
+
+
+def write_table(table: pd.DataFrame, path: str) -> None:
+    tmp_path = path + '.tmp'
+    if path.endswith('.feather'):
+        table.reset_index(drop=True).to_feather(tmp_path)
+    else:
+        table.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def aggregate(kind: str, files: List[str], signatures: Dict[str, list], manifest: Dict[str, list], out_path: str,
+              pool: ProcessPoolExecutor) -> Tuple[pd.DataFrame, int]:
+    """
+    Update one table (beh or triggers): keep rows of unchanged files, parse new and changed ones.
+    :return: Updated table and no of parsed files.
+    """
+    parse, types = (parse_beh, BEH_TYPES) if kind == 'beh' else (parse_triggermap, TRIGGER_TYPES)
+    old = read_table(out_path)
+    todo = [path for path in files if old is None or manifest.get(path) != signatures[path]]
+    keep = set(files) - set(todo)
+    parts = [old[old['source'].isin(keep)]] if old is not None else []
+    parts += list(pool.map(parse, todo))
+    parts = [part for part in parts if len(part)]
+    table = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=list(types) + ['source'])
+    return set_types(table, types), len(todo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Aggregate beh and triggermap files of all sessions.')
+    parser.add_argument('res_dirs', nargs='*', default=RES_DIRS, help='Results dirs, all procedures by default.')
+    parser.add_argument('--out', default='results_dataset', help='Dataset dir, with beh, triggers and manifest.')
+    parser.add_argument('--format', default='parquet', choices=['parquet', 'feather'])
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size, no of CPUs by default.')
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    manifest_path = join(args.out, MANIFEST)
+    manifest = json.load(open(manifest_path)) if os.path.exists(manifest_path) else dict()
+    files = {'beh': list(), 'triggers': list()}
+    for res_dir in args.res_dirs:
+        for kind, sub_dir in [('beh', 'beh'), ('triggers', 'triggermaps')]:
+            sub_dir = join(res_dir, sub_dir)
+            files[kind] += sorted(join(sub_dir, fname) for fname in os.listdir(sub_dir) if SESSION_FILE.match(fname))
+    # beh rows carry session config, so beh file is parsed again also when its config copy changes
+    signatures = {path: [file_stat(path), file_stat(conf_path(path))] for path in files['beh']}
+    signatures.update({path: [file_stat(path)] for path in files['triggers']})
+    signatures = json.loads(json.dumps(signatures))  # tuples as lists, like in manifest
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers or os.cpu_count() or 1) as pool:
+        for kind in ['beh', 'triggers']:
+            out_path = join(args.out, f'{kind}.{args.format}')
+            table, parsed = aggregate(kind, files[kind], signatures, manifest, out_path, pool)
+            write_table(table, out_path)
+            print(f'{kind}: {len(table)} rows from {len(files[kind])} files, {parsed} parsed -> {out_path}')
+    with open(manifest_path + '.tmp', 'w') as manifest_file:
+        json.dump(signatures, manifest_file)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    print(f'{time.perf_counter() - start:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Checks triggers recorded in EEG (BDF status channel) against triggermap saved by TriggerHandler.
+Status channel is read chunk by chunk from memory mapped file (misc.bdf), so even multi-GB recordings
+are checked in seconds. Recorded events are aligned with triggermap by trigger values, which are sent in
+sequence (1..60 and again), reported are dropped (sent, not recorded), extra (recorded, not sent) and late
+triggers. Send times are taken from send_time column of triggermap compacted from session journal, from
+TriggerHandler log kept in triggermap ('# ... Value: N sent to EEG.' lines) or from session journal, latency is
+recorded onset minus send time, relative to median of whole session.
+
+Example:
+    python align_triggers.py session.bdf cmp_freq_results/triggermaps/<PART_ID>_<time>_triggermap.csv
+    python align_triggers.py session.bdf <triggermap> --journal <ver>_results/journal/<PART_ID>.jsonl --out report.csv
+"""
+import argparse
+import csv
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from misc.bdf import BdfStatus
+from misc.journal import last_session, read_journal
+
+SENT_LINE = re.compile(r'^#\s*(\d+):(\d{2}):(\d{2}(?:\.\d+)?)\s*\|\s*\w+\s*\|\s*Value: (\d+) sent to EEG')
+
+
+def read_triggermap(path: str) -> Tuple[List[int], List[str], Optional[np.ndarray]]:
+    """
+    :return: Trigger values, trigger types and send times [in s] from send_time column or TriggerHandler log
+             (None if both are missing or don't match triggers).
+    """
+    values, types, sent, column = list(), list(), list(), list()
+    with open(path, 'r') as trigger_file:
+        lines = trigger_file.read().splitlines()
+    for row in csv.DictReader(line for line in lines if not line.startswith('#')):
+        values.append(int(row['trigger_no']))
+        types.append(row['trigger_type'])
+        column.append(row.get('send_time') or None)
+    if column and None not in column:
+        return values, types, np.array(column, dtype=np.float64)
+    for line in lines:
+        match = SENT_LINE.match(line)
+        if match:
+            hours, minutes, seconds, _ = match.groups()
+            sent.append(int(hours) * 3600 + int(minutes) * 60 + float(seconds))
+    return values, types, np.array(sent) if len(sent) == len(values) else None
+
+
+def journal_send_times(path: str, n_triggers: int) -> Optional[np.ndarray]:
+    sent = [record['time'] for record in last_session(read_journal(path)) if record['kind'] == 'trigger']
+    return np.array(sent) if len(sent) == n_triggers else None
+
+
+def match_events(expected: List[int], recorded: np.ndarray, window: int = 8) -> Tuple[np.ndarray, List[int]]:
+    """
+    Align sent trigger values with recorded ones. Every sent trigger is looked for in next **window** recorded
+    events, recorded events skipped on the way are extra.
+    :return: Index of recorded event for every sent trigger (-1 if dropped) and indices of extra recorded events.
+    """
+    matched = np.full(len(expected), -1, dtype=np.int64)
+    extra = list()
+    pos = 0
+    for idx, value in enumerate(expected):
+        ahead = np.flatnonzero(recorded[pos:pos + window] == value)
+        if len(ahead):
+            extra.extend(range(pos, pos + ahead[0]))
+            matched[idx] = pos + ahead[0]
+            pos += ahead[0] + 1
+    extra.extend(range(pos, len(recorded)))
+    return matched, extra
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check EEG triggers of session against its triggermap.')
+    parser.add_argument('bdf', help='BioSemi recording.')
+    parser.add_argument('triggermap', help='Triggermap of session.')
+    parser.add_argument('--journal', default=None, help='Session journal, source of send times.')
+    parser.add_argument('--channel', default='Status')
+    parser.add_argument('--mask', type=lambda val: int(val, 0), default=0xFFFF, help='Mask of trigger bits.')
+    parser.add_argument('--window', type=int, default=8, help='Recorded events searched for every sent trigger.')
+    parser.add_argument('--late-ms', type=float, default=2.0, help='Latency above session median marked as late.')
+    parser.add_argument('--out', default=None, help='Per trigger report csv.')
+    args = parser.parse_args()
+
+    status = BdfStatus(args.bdf, channel=args.channel)
+    onsets, codes = status.events(mask=args.mask)
+    values, types, sent = read_triggermap(args.triggermap)
+    if args.journal is not None:
+        sent = journal_send_times(args.journal, len(values))
+    matched, extra = match_events(values, codes, args.window)
+    found = matched >= 0
+    onset_times = np.full(len(values), np.nan)
+    onset_times[found] = onsets[matched[found]] / status.sample_rate
+
+    print(f'{len(values)} triggers sent, {len(codes)} recorded ({status.n_records} records, {status.sample_rate:g} Hz)')
+    print(f'matched: {found.sum()}, dropped: {(~found).sum()}, extra: {len(extra)}')
+    for idx in np.flatnonzero(~found):
+        print(f'  dropped #{idx + 1}: value {values[idx]}, {types[idx]}')
+    for idx in extra:
+        print(f'  extra: value {codes[idx]} at {onsets[idx] / status.sample_rate:.4f} s')
+
+    latency = np.full(len(values), np.nan)
+    late = np.zeros(len(values), dtype=bool)
+    if sent is None:
+        print('No send times (TriggerHandler log or journal), latency not checked.')
+    elif found.any():
+        delay = onset_times - sent
+        latency = delay - np.nanmedian(delay)  # clocks of EEG and stimulus PC have different zero
+        late = latency > args.late_ms / 1000.0
+        lat_ms = latency[found] * 1000
+        print(f'latency [ms] mean: {lat_ms.mean():.3f}, std: {lat_ms.std():.3f}, min: {lat_ms.min():.3f}, '
+              f'p95: {np.percentile(lat_ms, 95):.3f}, max: {lat_ms.max():.3f}, '
+              f'resolution: {1000 / status.sample_rate:.3f}')
+        print(f'late (> {args.late_ms:g} ms): {late.sum()}')
+        for trigger_type in sorted(set(types)):
+            of_type = found & (np.array(types) == trigger_type)
+            if of_type.any():
+                print(f'  {trigger_type}: mean {latency[of_type].mean() * 1000:.3f} ms, '
+                      f'std {latency[of_type].std() * 1000:.3f} ms')
+
+    if args.out is not None:
+        with open(args.out, 'w', newline='') as report_file:
+            writer = csv.writer(report_file)
+            writer.writerow(['trigger_idx', 'trigger_no', 'trigger_type', 'status', 'onset_time', 'latency_ms',
+                             'late'])
+            for idx, (value, trigger_type) in enumerate(zip(values, types)):
+                writer.writerow([idx + 1, value, trigger_type, 'matched' if found[idx] else 'dropped',
+                                 onset_times[idx], latency[idx] * 1000, late[idx]])
+
+
+if __name__ == '__main__':
+    main()
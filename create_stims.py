@@ -1,25 +1,159 @@
-from misc.audio import Dict2Obj, get_sine_wave, get_white_noise
-from pygame import mixer, quit
-from scipy.io import wavfile
-import wavio
+#!/usr/bin/env python3
+"""
+Batch stimulus generation. Tones for every (freq, duration) pair from the grid are synthesised on a process pool
+and written into a single stimulus pack (out path ending with .pack) or into a directory of 16-bit WAV files.
+Entries already present, matching their SHA-1 and synthesised with this same ramp shape are skipped (pack built
+with other ramp shape is rebuilt as a whole).
+
+Examples:
+    python create_stims.py --freqs 300:600 --durations 3000 --rate 22050 --ramp 0 --out audio_stims
+    python create_stims.py --freqs 400:481 --durations 500 530 560 --out audio_stims/stims.pack
+"""
+import argparse
+import csv
+import hashlib
+import os
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from os.path import join
+from typing import Dict, List, Tuple
+
 import numpy as np
 
-# WSF = 32768
-# SAMPLING_RATE = 44100
-#
-# mixer.pre_init(SAMPLING_RATE, -16, 2, 512)
-# mixer.init(SAMPLING_RATE, -16, 2, 512)
-# mixer.set_num_channels(2)
-#
-# for freq in range(450, 460):
-#     sound = get_sine_wave(freq=freq, sampling_rate=SAMPLING_RATE, wave_length=2000, wsf=WSF)
-#     wavfile.write(f'audio_stims/{freq}.wav', SAMPLING_RATE, sound)
-    
-rate = 22050           # samples per second
-T = 3                  # sample duration (seconds)
-n = int(rate*T)        # number of samples
-t = np.arange(n)/rate  # grid of time values
-
-for f in range(300, 600):
-    x = np.sin(2*np.pi * f * t)
-    wavio.write(f"audio_stims/{f}.wav", x, rate, sampwidth=3)
\ No newline at end of file
+from misc.stim_pack import StimPack, payload_digest
+from misc.synth import RAMPS, sine_tone
+from misc.tone_bank import ToneKey, tone_key
+
+WAV_INDEX = 'index.csv'
+
+
+def parse_grid(values: List[str]) -> List[float]:
+    """
+    Grid values, every one is a number or numpy.arange like 'start:stop[:step]' range.
+    """
+    grid = list()
+    for val in values:
+        if ':' in val:
+            grid.extend(np.arange(*map(float, val.split(':'))).tolist())
+        else:
+            grid.append(float(val))
+    return grid
+
+
+def wav_name(key: ToneKey, single_duration: bool) -> str:
+    freq, duration, _, _ = key
+    freq = f'{freq:g}'
+    return f'{freq}.wav' if single_duration else f'{freq}_{duration * 1000:g}.wav'
+
+
+def synthesise(key: ToneKey, ramp_shape: str, wav_path: str = None) -> Tuple[ToneKey, np.ndarray, bytes]:
+    """
+    Worker func. Synthesise tone and, for WAV output, encode it to file in worker process.
+    :return: Key, samples (None for WAV output) and SHA-1 of samples (of whole file for WAV output).
+    """
+    freq, duration, rate, ramp = key
+    audio = sine_tone(freq, duration, sample_rate=rate, transition_time=ramp, ramp=ramp_shape)
+    if wav_path is None:
+        return key, audio, payload_digest(audio)
+    with wave.open(wav_path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(audio.astype('<i2').tobytes())
+    return key, None, file_digest(wav_path)
+
+
+def file_digest(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).digest()
+
+
+def existing_pack_entries(path: str, ramp_shape: str) -> Dict[ToneKey, Tuple[np.ndarray, bytes]]:
+    """
+    Valid entries of already existing pack, damaged (not matching SHA-1) are dropped.
+    Pack with other ramp shape (or of older format) gives no entries, so it's rebuilt.
+    """
+    if not os.path.exists(path):
+        return dict()
+    try:
+        pack = StimPack(path, ramp_shape=ramp_shape)
+    except ValueError:
+        return dict()
+    entries = dict()
+    for key in pack.keys():
+        audio, digest = pack.get(*key), pack.digest(*key)
+        if payload_digest(audio) == digest:
+            entries[key] = (np.array(audio), digest)
+    return entries
+
+
+def existing_wav_entries(out_dir: str, ramp_shape: str) -> Dict[str, Tuple[ToneKey, bytes]]:
+    """
+    Valid entries from WAV directory index, files missing, not matching SHA-1 or with other ramp shape are dropped.
+    """
+    entries = dict()
+    if not os.path.exists(join(out_dir, WAV_INDEX)):
+        return entries
+    with open(join(out_dir, WAV_INDEX)) as index_file:
+        for row in csv.DictReader(index_file):
+            path, digest = join(out_dir, row['file']), bytes.fromhex(row['sha1'])
+            if row.get('ramp_shape') == ramp_shape and os.path.exists(path) and file_digest(path) == digest:
+                key = tone_key(row['freq'], row['duration'], row['rate'], row['ramp'])
+                entries[row['file']] = (key, digest)
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate sine tone stimuli for frequency/duration grid.')
+    parser.add_argument('--freqs', nargs='+', default=['300:600'], help='Freqs [in Hz], values or start:stop[:step].')
+    parser.add_argument('--durations', nargs='+', default=['3000'], help='Durations [in ms], values or ranges.')
+    parser.add_argument('--rate', type=int, default=22050, help='Sampling rate [in Hz].')
+    parser.add_argument('--ramp', type=float, default=0, help='Rise up and fall down time [in ms].')
+    parser.add_argument('--ramp-shape', default='linear', choices=RAMPS)
+    parser.add_argument('--out', default='audio_stims', help='Stimulus pack (*.pack) or WAV directory.')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size, no of CPUs by default.')
+    args = parser.parse_args()
+
+    durations = parse_grid(args.durations)
+    keys = [tone_key(freq, duration / 1000.0, args.rate, args.ramp / 1000.0)
+            for freq in parse_grid(args.freqs) for duration in durations]
+    keys = list(dict.fromkeys(keys))
+    to_pack = args.out.endswith('.pack')
+    os.makedirs((os.path.dirname(args.out) or '.') if to_pack else args.out, exist_ok=True)
+    if to_pack:
+        done = existing_pack_entries(args.out, args.ramp_shape)
+        todo = [key for key in keys if key not in done]
+        wav_paths = [None] * len(todo)
+    else:
+        single_duration = len(durations) == 1
+        done = existing_wav_entries(args.out, args.ramp_shape)
+        todo = [key for key in keys if done.get(wav_name(key, single_duration), (None,))[0] != key]
+        wav_paths = [join(args.out, wav_name(key, single_duration)) for key in todo]
+
+    start = time.perf_counter()
+    workers = args.workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(todo) // (4 * workers))
+        results = list(pool.map(synthesise, todo, [args.ramp_shape] * len(todo), wav_paths, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    if to_pack:
+        tones = dict(done)
+        tones.update({key: (audio, digest) for key, audio, digest in results})
+        StimPack.write(args.out, tones, ramp_shape=args.ramp_shape)
+    else:
+        for (key, _, digest), path in zip(results, wav_paths):
+            done[os.path.basename(path)] = (key, digest)
+        with open(join(args.out, WAV_INDEX), 'w', newline='') as index_file:
+            writer = csv.writer(index_file)
+            writer.writerow(['file', 'freq', 'duration', 'rate', 'ramp', 'ramp_shape', 'sha1'])
+            for name, (key, digest) in sorted(done.items()):
+                writer.writerow([name, *key, args.ramp_shape, digest.hex()])
+    rate = len(results) / elapsed if elapsed > 0 else float('inf')
+    print(f'{len(results)} tones created, {len(keys) - len(results)} skipped, '
+          f'{elapsed:.2f} s, {rate:.1f} tones/s -> {args.out}')
+
+
+if __name__ == '__main__':
+    main()
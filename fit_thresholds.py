@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Per session (and per track, for interleaved staircases) thresholds of staircase (experiment phase) runs:
+reversal-mean threshold and maximum likelihood Weibull fit (threshold at convergence prob of N_UP/N_DOWN from
+session config, 3-up/1-down by default), both with bootstrap CIs. Sessions are read from results dirs or from
+dataset made by aggregate_results.py, and fitted on process pool. Fits are cached by hash of session's beh content
+(and fit settings), so only new or changed sessions are fitted on later runs.
+
+Example:
+    python fit_thresholds.py --out thresholds.csv
+    python fit_thresholds.py --dataset results_dataset/beh.parquet --n-boot 2000 --out thresholds.csv
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from Adaptives.BatchNUpNDownMinIters import convergence_p
+from aggregate_results import BEH_TYPES, RES_DIRS, SESSION_FILE, parse_beh, read_table, set_types
+from misc.bootstrap import bootstrap
+from misc.psychometric import WeibullGrid, reversal_threshold
+
+INFO = ['procedure', 'session', 'PART_ID', 'name', 'sex', 'age']
+
+
+def fit_track(exp: pd.DataFrame, target_p: float, n_boot: int, discard_revs: int, seed: int,
+              chunk_size: int = 256) -> Dict[str, object]:
+    """
+    Thresholds of one staircase (experiment rows of one track).
+    """
+    levels = exp['SOA'].to_numpy(dtype=np.float64)
+    corr = exp['Corr'].fillna(False).to_numpy(dtype=bool)
+    reversals = exp['Reversal'].fillna(0).to_numpy(dtype=bool)
+    row = dict(n_trials=len(exp), n_revs=int(reversals.sum()), target_p=target_p,
+               rev_threshold=reversal_threshold(levels, reversals, discard_revs), fit_threshold=np.nan,
+               fit_alpha=np.nan, fit_slope=np.nan)
+    if len(exp) and levels.max() > 0:
+        grid = WeibullGrid(max_level=1.5 * levels.max())
+        row['fit_alpha'], row['fit_slope'] = grid.fit(levels, corr)
+        row['fit_threshold'] = float(grid.level_for(target_p, row['fit_alpha'], row['fit_slope']))
+        row.update(bootstrap(levels, corr, reversals, grid, target_p, n_boot=n_boot, discard_revs=discard_revs,
+                             seed=seed, chunk_size=chunk_size))
+    return {name: float(val) if isinstance(val, np.floating) else val for name, val in row.items()}
+
+
+def fit_session(beh: pd.DataFrame, n_boot: int, discard_revs: int, seed: int,
+                chunk_size: int = 256) -> List[Dict[str, object]]:
+    """
+    Worker func, thresholds of one session, one row per track (interleaved staircases, single one in sessions
+    without Track column).
+    :param beh: Typed beh rows of session (like in aggregated dataset), path of beh file is also accepted.
+    """
+    if isinstance(beh, str):
+        beh = set_types(parse_beh(beh), BEH_TYPES)
+    exp = beh[beh['Exp'] == 'exp']
+    # header only beh files (session ended before first trial) still get conf_ columns, but no values
+    n_up, n_down = [int(beh[f'conf_{param}'].dropna().iloc[0])
+                    if f'conf_{param}' in beh and beh[f'conf_{param}'].notna().any() else default
+                    for param, default in [('N_UP', 3), ('N_DOWN', 1)]]
+    target_p = convergence_p(n_up, n_down)
+    if 'Track' not in exp or exp['Track'].isna().all():
+        return [dict(track='main', **fit_track(exp, target_p, n_boot, discard_revs, seed, chunk_size))]
+    return [dict(track=track, **fit_track(track_exp, target_p, n_boot, discard_revs, seed, chunk_size))
+            for track, track_exp in exp.groupby('Track', observed=True, sort=True)]
+
+
+def session_tasks(res_dirs: List[str], dataset: str = None) -> List[Tuple[str, Dict[str, object], object]]:
+    """
+    :return: List of (content hash, session info, beh rows or beh file path), one per session.
+    """
+    tasks = list()
+    if dataset is not None:
+        for _, beh in read_table(dataset).groupby('session', observed=True, sort=True):
+            content = beh.drop(columns=['source']).to_csv(index=False).encode('utf-8')
+            tasks.append((hashlib.sha256(content).hexdigest(), beh[INFO].iloc[0].to_dict(), beh))
+        return tasks
+    for res_dir in res_dirs:
+        beh_dir = os.path.join(res_dir, 'beh')
+        for fname in sorted(fname for fname in os.listdir(beh_dir) if SESSION_FILE.match(fname)):
+            path = os.path.join(beh_dir, fname)
+            with open(path, 'rb') as beh_file:
+                content_hash = hashlib.sha256(beh_file.read()).hexdigest()
+            part_id, stamp, _ = SESSION_FILE.match(fname).groups()
+            info = dict(procedure=os.path.basename(os.path.normpath(res_dir)).replace('_results', ''),
+                        session=f'{part_id}_{stamp}', PART_ID=part_id)
+            tasks.append((content_hash, info, path))
+    return tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Thresholds of all sessions, with bootstrap CIs.')
+    parser.add_argument('res_dirs', nargs='*', default=RES_DIRS, help='Results dirs, all procedures by default.')
+    parser.add_argument('--dataset', default=None, help='beh table of aggregate_results.py, used instead of dirs.')
+    parser.add_argument('--out', default='thresholds.csv')
+    parser.add_argument('--cache', default='thresholds_cache.json', help='Fits of already seen sessions.')
+    parser.add_argument('--n-boot', type=int, default=1000, help='Bootstrap resamples per session.')
+    parser.add_argument('--discard-revs', type=int, default=0, help='No of first reversals not used.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=256, help='Resamples fitted at once, bounds memory.')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size, no of CPUs by default.')
+    args = parser.parse_args()
+    if args.dataset is not None and not os.path.exists(args.dataset):
+        parser.error(f'No dataset {args.dataset}, run aggregate_results.py first.')
+
+    cache = json.load(open(args.cache)) if os.path.exists(args.cache) else dict()
+    settings = f'n_boot={args.n_boot},discard_revs={args.discard_revs},seed={args.seed},tracks'
+    tasks = [(f'{content_hash}:{settings}', info, beh) for content_hash, info, beh in
+             session_tasks(args.res_dirs, args.dataset)]
+    todo = [(key, beh) for key, _, beh in tasks if key not in cache]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers or os.cpu_count() or 1) as pool:
+        fits = pool.map(fit_session, [beh for _, beh in todo], [args.n_boot] * len(todo),
+                        [args.discard_revs] * len(todo), [args.seed] * len(todo), [args.chunk_size] * len(todo))
+        for (key, _), fit in zip(todo, fits):
+            cache[key] = fit
+    with open(args.cache + '.tmp', 'w') as cache_file:
+        json.dump(cache, cache_file)
+    os.replace(args.cache + '.tmp', args.cache)
+
+    table = pd.DataFrame([{**info, **fit} for key, info, _ in tasks for fit in cache[key]])
+    table.to_csv(args.out, index=False)
+    print(f'{len(tasks)} sessions, {len(todo)} fitted, {time.perf_counter() - start:.2f} s -> {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -8,17 +8,31 @@ import os
 import random
 import shutil
 import time
+from functools import partial
 from os.path import join
 from typing import List, Tuple, Dict
 
 import yaml
 from psychopy import visual, event, logging, gui, core
-import simpleaudio as sa
-import numpy as np
 
 
+from Adaptives.Interleaved import Interleaved
 from Adaptives.NUpNDownMinIters import NUpNDownMinIters
-from misc.audio import Dict2Obj
+from Adaptives.StoppingRules import MaxTrials, MinTrials, ThresholdSE
+from misc.audio import Dict2Obj, load_wave
+from misc.audio_engine import AudioEngine
+from misc.journal import (Journal, handler_log, last_session, read_journal, resume_point, session_stamp,
+                          training_done, write_beh, write_triggermap)
+from misc.prefetch import Prefetcher
+from misc.registry import ABORTED, COMPLETE, ParticipantRegistry
+from misc.responses import ResponseCollector
+from misc.snapshots import SnapshotStore, session_files
+from misc.stim_pack import StimPack
+from misc.synth import sine_tone
+from misc.text_stims import N_, TextStimRegistry
+from misc.trial_renderer import TrialRenderer
+from misc.trigger_scheduler import TriggerScheduler
+from misc.tone_bank import ToneBank, staircase_levels
 from procedures_misc.screen_misc import get_frame_rate, get_screen_res
 from procedures_misc.triggers import TriggerHandler
 
@@ -38,9 +52,28 @@ class TriggerTypes(object):
 
 
 TRIGGERS = TriggerHandler(TriggerTypes.vals(), trigger_params=['corr', 'key'])
-
-RESULTS = [['PART_ID', 'Trial', 'Proc_version', 'Exp', 'Key', 'Corr', 'SOA', 'Reversal', 'Level', 'Rev_count', 'Lat',
-            'Standard_first', 'Standard_higher']]
+LABELS: TextStimRegistry = None  # Built in main() when window and language are known
+RESPONSES: ResponseCollector = None  # Built in main() when response keys are known
+AUDIO: AudioEngine = None  # Opened in main(), one output stream for whole session
+RENDERER: TrialRenderer = None  # Built in main() when sampling rate is known
+SCHEDULER: TriggerScheduler = None  # Started in main(), all triggers are sent through it
+JOURNAL: Journal = None  # Opened in main(), every trial row and trigger is journaled as it happens
+REGISTRY: ParticipantRegistry = None  # Opened in main(), shared by all procedures
+SESSION_ID: int = None  # Registry id of current session
+
+BEH_HEADER = ['PART_ID', 'Trial', 'Proc_version', 'Exp', 'Key', 'Corr', 'SOA', 'Reversal', 'Level', 'Rev_count', 'Lat',
+              'Standard_first', 'Standard_higher', 'Track']
+INFO_MSGS = {  # msgids of show_info messages, per procedure and phase
+    'cmp_vol': {'before training': N_('Volume: before training'),
+                'before experiment': N_('Volume: before experiment'), 'end': N_('Volume: end')},
+    'cmp_freq': {'hello, before learning': N_('Freq: hello, before learning'),
+                 'hello, after learning': N_('Freq: hello, after learning'),
+                 'before training': N_('Freq: before training'),
+                 'before experiment': N_('Freq: before experiment'), 'end': N_('Freq: end')},
+    'cmp_dur': {'before training': N_('Dur: before training'),
+                'before experiment': N_('Dur: before experiment'), 'end': N_('Dur: end')}}
+STAIRCASE_PARAMS = ['N_UP', 'N_DOWN', 'START_SOA', 'MAX_REVS', 'STEP_UP', 'STEP_DOWN', 'MIN_TRIALS', 'MAX_TRIALS',
+                    'TARGET_SE']  # can be set per track in TRACKS
 
 
 def check_exit(key='f7'):
@@ -52,6 +85,8 @@ def check_exit(key='f7'):
 
 def abort_with_error(err):
     logging.critical(err)
+    if SESSION_ID is not None:
+        REGISTRY.set_state(SESSION_ID, ABORTED)
     safe_quit()
     core.quit()
     quit()
@@ -63,7 +98,7 @@ def show_info(win: visual, msg: str, insert: Dict[str, str] = {}, font_name: str
     """
     Clear way to show info messages on screen.
     :param win: psychopy.Window object, main experiment.
-    :param msg: Message string to show.
+    :param msg: Label id (gettext msgid) of message to show, prebuilt stimulus is taken from LABELS.
     :param insert: Additional (usually generated in runtime) message, replaced '<--insert-->' in loaded file.
     :param font_name:
     :param font_color:
@@ -74,8 +109,7 @@ def show_info(win: visual, msg: str, insert: Dict[str, str] = {}, font_name: str
     if insert:
         for key, value in insert.items():
             msg.replace(key, value)
-    msg = visual.TextStim(win, font=font_name, color=font_color,
-                          text=msg, height=font_size, wrapWidth=font_max_width)
+    msg = LABELS.get(msg, font=font_name, color=font_color, height=font_size, wrapWidth=font_max_width)
     msg.draw()
     win.flip()
     key = event.waitKeys(keyList=['return', 'space', 'f7'])
@@ -100,10 +134,23 @@ def safe_quit() -> None:
         time.strftime("%Y-%m-%d_%H_%M_%S", time.gmtime()) + '_beh.csv'
     tname = PART_ID + "_" + \
         time.strftime("%Y-%m-%d_%H_%M_%S", time.gmtime()) + '_triggermap.csv'
-    with open(join(RES_DIR, 'beh', fname), 'w') as beh_file:
-        beh_writer = csv.writer(beh_file)
-        beh_writer.writerows(RESULTS)
-    TRIGGERS.save_to_file(join(RES_DIR, 'triggermaps', tname))
+    if JOURNAL is not None:  # beh and triggermap files are compacted from journal, which already is on disk
+        JOURNAL.close()
+        records = last_session(read_journal(JOURNAL.path))
+        # named after session start, so resumed session overwrites files written when it crashed
+        stamp = session_stamp(records)
+        write_beh(records, join(RES_DIR, 'beh', f'{PART_ID}_{stamp}_beh.csv'))
+        # TriggerHandler log (values sent to EEG) of this run, appended to logs of earlier (crashed) runs
+        run_log = join(RES_DIR, 'triggermaps', tname + '.log.tmp')
+        TRIGGERS.save_to_file(run_log)
+        triggermap = join(RES_DIR, 'triggermaps', f'{PART_ID}_{stamp}_triggermap.csv')
+        write_triggermap(records, triggermap, log=handler_log(triggermap) + handler_log(run_log))
+        if os.path.exists(run_log):
+            os.remove(run_log)
+    else:
+        with open(join(RES_DIR, 'beh', fname), 'w') as beh_file:
+            csv.writer(beh_file).writerow(BEH_HEADER)
+        TRIGGERS.save_to_file(join(RES_DIR, 'triggermaps', tname))
     logging.flush()
     core.quit()
     quit()
@@ -115,32 +162,101 @@ class TrialType(object):
     CMP_VOL = 'cmp_vol'
 
 
-def prepare_sound(freq, sound_time, sample_rate=44100, transition_time=0.05):
-    sample_rate = 44100
-    t = np.linspace(0, sound_time, int(sound_time * sample_rate), False)
+def prepare_sound(freq, sound_time, sample_rate=44100, transition_time=0.05, ramp='linear'):
+    # sine wave note with rise_up and fall_down to avoid noises, normalized to 16-bit range
+    return sine_tone(freq=freq, sound_time=sound_time, sample_rate=sample_rate, transition_time=transition_time,
+                     ramp=ramp)
 
-    # generate sine wave note
-    note = np.sin(freq * t * 2 * np.pi)
 
-    # add rise_up and fall_down to sound to avoid noises
-    transition_samples = int(transition_time * sample_rate)
-    fall_down = np.linspace(1, 0, transition_samples)
-    rise_up = np.linspace(0, 1, transition_samples)
-    pass_throught = [1] * (len(note) - (2 * transition_samples))
-    transition = np.hstack((rise_up, pass_throught, fall_down))
-    audio = note * transition
+TONES = ToneBank(synth=prepare_sound)  # Rebuilt with session params in main()
 
-    # normalize to 16-bit range
-    audio *= 32767 / np.max(np.abs(audio))
-    # convert to 16-bit data
-    return audio.astype(np.int16)
 
+def trial_tone_keys(trial_type: TrialType, soa: int, conf: Dict2Obj) -> List[Tuple[float, float, int, float]]:
+    """
+    Keys of tones run_trial can need for given soa, for both signs of soa.
+    Args:
+        trial_type: Procedure version.
+        soa: difference between stimuli.
+        conf: Dict with global params defined by user.
 
-def play_sound(audio, sample_rate=44100) -> None:
-    # start playback
-    play_obj = sa.play_buffer(audio, 1, 2, sample_rate)
-    # wait for playback to finish before exiting
-    play_obj.wait_done()
+    Returns:
+        List of (freq, duration, sample rate, ramp) keys.
+    """
+    stim_time = conf.TIME / 1000.0
+    tones = [(conf.STANDARD_FREQ, stim_time)]
+    if trial_type == TrialType.CMP_FREQ:
+        tones += [(conf.STANDARD_FREQ + soa, stim_time), (conf.STANDARD_FREQ - soa, stim_time)]
+    elif trial_type == TrialType.CMP_DUR:
+        tones += [(conf.STANDARD_FREQ, (conf.TIME + soa) / 1000.0), (conf.STANDARD_FREQ, (conf.TIME - soa) / 1000.0)]
+    return [TONES.key(freq, sound_time) for freq, sound_time in tones if sound_time > 0]
+
+
+def tone_bank_keys(trial_type: TrialType, conf: Dict2Obj) -> List[Tuple[float, float, int, float]]:
+    """
+    Keys of all tones session can need, most probable first: standard, learning, training and
+    staircase levels closest to START_SOA. List is cut to TONE_BANK_SIZE, so warm up never evicts itself.
+    Args:
+        trial_type: Procedure version.
+        conf: Dict with global params defined by user.
+
+    Returns:
+        List of (freq, duration, sample rate, ramp) keys.
+    """
+    keys = list()
+    if trial_type == TrialType.CMP_FREQ:
+        train_time = conf.TRAIN_SOUND_TIME / 1000.0
+        keys.append(TONES.key(conf.STANDARD_FREQ, train_time))
+        for soa in conf.LEARNING_SOAS:
+            keys += [TONES.key(conf.STANDARD_FREQ + soa, train_time), TONES.key(conf.STANDARD_FREQ - soa, train_time)]
+    tracks = [track_params(track, conf) for track in conf.TRACKS]
+    levels = [staircase_levels(start_val=params['START_SOA'], step_up=params['STEP_UP'],
+                               step_down=params['STEP_DOWN'], max_levels=conf.TONE_BANK_SIZE // (2 * len(tracks)))
+              for params in tracks]
+    levels = [lvl for track_levels in zip(*levels) for lvl in track_levels]  # closest to start of every track first
+    for soa in [train_desc['soa'] for train_desc in conf.TRAINING] + levels:
+        keys += trial_tone_keys(trial_type, soa, conf)
+    return list(dict.fromkeys(keys))[:conf.TONE_BANK_SIZE]
+
+
+def track_params(track: Dict, conf: Dict2Obj) -> Dict:
+    """
+    Staircase params of one track: values given in track entry of conf.TRACKS, global ones otherwise.
+    """
+    return {name: track.get(name, conf[name]) for name in STAIRCASE_PARAMS}
+
+
+def build_tracks(conf: Dict2Obj) -> Interleaved:
+    """
+    Experiment procedure: staircases of all tracks from conf.TRACKS, interleaved in conf.TRACK_ORDER.
+    """
+    tracks = dict()
+    for track in conf.TRACKS:
+        params = track_params(track, conf)
+        stop_rule = MaxTrials(params['MAX_TRIALS'])
+        if params['TARGET_SE'] and params['MIN_TRIALS'] >= params['MAX_TRIALS']:
+            logging.warning(f"Track {track['name']}: TARGET_SE has no effect, MIN_TRIALS ({params['MIN_TRIALS']}) "
+                            f"is not lower than MAX_TRIALS ({params['MAX_TRIALS']}).")
+        if params['TARGET_SE']:  # end as soon as threshold is precise enough
+            stop_rule = stop_rule | MinTrials(params['MIN_TRIALS'], ThresholdSE(params['TARGET_SE']))
+        tracks[track['name']] = NUpNDownMinIters(n_up=params['N_UP'], n_down=params['N_DOWN'],
+                                                 start_val=params['START_SOA'], max_revs=params['MAX_REVS'],
+                                                 step_up=params['STEP_UP'], step_down=params['STEP_DOWN'],
+                                                 min_iters=params['MIN_TRIALS'], stop_rule=stop_rule)
+    return Interleaved(tracks, order=conf.TRACK_ORDER)
+
+
+def play_sound(audio) -> None:
+    # start playback on session stream and wait for playback to finish
+    AUDIO.play(audio).wait_done()
+
+
+def wait_until(t: float) -> None:
+    """
+    Sleep until given time in core clock, returns immediately if it already passed.
+    """
+    remaining = t - core.getTime()
+    if remaining > 0:
+        time.sleep(remaining)
 
 
 def present_learning_sample(win: visual, idx: int, soa: int, standard_freq: float, audio_separator,
@@ -161,21 +277,18 @@ def present_learning_sample(win: visual, idx: int, soa: int, standard_freq: floa
 
     if soa < 0:
         raise ValueError('Learning phase soa must be positive.')
-    label = visual.TextStim(win, color=conf.FONT_COLOR,
-                            height=conf.FONT_SIZE, wrapWidth=conf.SCREEN_RES['width'])
     soa = random.choice([-soa, soa])
     freqs = [standard_freq, standard_freq + soa]
     random.shuffle(freqs)
     first_sound_freq, sec_sound_freq = freqs
-    msg = _("First tone higher") if first_sound_freq > sec_sound_freq else _("First tone lower")
+    msg = N_("First tone higher") if first_sound_freq > sec_sound_freq else N_("First tone lower")
     sound_time = conf.TRAIN_SOUND_TIME / 1000.
-    first_sound = prepare_sound(freq=first_sound_freq, sound_time=sound_time)
-    sec_sound = prepare_sound(freq=sec_sound_freq, sound_time=sound_time)
+    first_sound = TONES.get(freq=first_sound_freq, sound_time=sound_time)
+    sec_sound = TONES.get(freq=sec_sound_freq, sound_time=sound_time)
     
     # === Play separator ===
     check_exit()
-    play_obj = audio_separator.play()
-    play_obj.wait_done()
+    play_sound(audio=audio_separator)
     core.wait(2 * sound_time)
     check_exit()
     # === First Sound ===
@@ -190,16 +303,13 @@ def present_learning_sample(win: visual, idx: int, soa: int, standard_freq: floa
     check_exit()
     core.wait(sound_time / 2)
     check_exit()
-    label.setText(msg)
-    label.draw()
+    LABELS.get(msg).draw()
     win.flip()
     core.wait(3 * sound_time)
     check_exit()
     win.flip()
     core.wait(sound_time)
-    msg = _("Learning: Next")
-    label.setText(msg)
-    label.draw()
+    LABELS.get(N_("Learning: Next")).draw()
     win.flip()
     event.waitKeys(keyList=['space'])
     core.wait(sound_time//2)
@@ -207,10 +317,10 @@ def present_learning_sample(win: visual, idx: int, soa: int, standard_freq: floa
 
 
 def main():
-    global RES_DIR, PART_ID
+    global RES_DIR, PART_ID, TONES, LABELS, RESPONSES, AUDIO, RENDERER, SCHEDULER, JOURNAL, REGISTRY, SESSION_ID
     # %% === Dialog popup ===
     info = {'PART_ID': '', 'Sex': ["MALE", "FEMALE"],
-            'AGE': '20', 'VERSION': ['cmp_dur', 'cmp_freq']}
+            'AGE': '20', 'VERSION': ['cmp_dur', 'cmp_freq'], 'RESUME': False}
     dictDlg = gui.DlgFromDict(
         dictionary=info, title="Study Y. Sound Procedures.")
     if not dictDlg.OK:
@@ -229,9 +339,24 @@ def main():
         app = wx.App()
         wx.MessageBox(msg, 'Error',  wx.OK | wx.ICON_ERROR)
         raise AttributeError('Participant name cannot have underscore in it.')
-    curr_id_already_used = info['PART_ID'] in [
-        f.split('_')[0] for f in os.listdir(join(f'{ver}_results', 'beh'))]
-    if curr_id_already_used:
+    journal_path = join(RES_DIR, 'journal', PART_ID + '.jsonl')
+    resume = info['RESUME']
+    if resume and not os.path.exists(journal_path):
+        msg = f"No journal of {PART_ID} in {ver}, nothing to resume."
+        logging.critical(msg)
+        app = wx.App()
+        wx.MessageBox(msg, 'Error',  wx.OK | wx.ICON_ERROR)
+        raise AttributeError('No session to resume.')
+    REGISTRY = ParticipantRegistry('participants.sqlite',
+                                   backfill_dirs=[f'{proc}_results' for proc in ['cmp_dur', 'cmp_freq', 'cmp_vol']])
+    if resume and not REGISTRY.can_resume(info['PART_ID'], ver):
+        msg = f"Last session of {PART_ID} in {ver} is complete, nothing to resume."
+        logging.critical(msg)
+        app = wx.App()
+        wx.MessageBox(msg, 'Error',  wx.OK | wx.ICON_ERROR)
+        raise AttributeError('No session to resume.')
+    curr_id_already_used = REGISTRY.id_used(info['PART_ID'], ver)
+    if curr_id_already_used and not resume:
         msg = f"Current id:{info['PART_ID']} already used, check if you choose right proc ver({ver})."
         logging.critical(msg)
         app = wx.App()
@@ -270,12 +395,48 @@ def main():
     conf.FRAME_RATE = FRAME_RATE
     logging.info('FRAME RATE: {}'.format(FRAME_RATE))
     logging.info('SCREEN RES: {}'.format(SCREEN_RES.values()))
+    RESPONSES = ResponseCollector(key_list=[conf.FIRST_SOUND_KEY, conf.SECOND_SOUND_KEY])
+    logging.info(f'RT hardware timestamps: {RESPONSES.hardware_timestamps}, '
+                 f'RT resolution: {RESPONSES.rt_resolution * 1000:.4f} ms')
     shutil.copy2(f'{ver}_config.yaml', join(
         RES_DIR, 'conf', f'{PART_ID}_{ver}_config.yaml'))
-    shutil.copy2('main.py', join(RES_DIR, 'source', PART_ID + '_main.py'))
+    resumed = resume_point(journal_path) if resume else None
+    trained = training_done(journal_path) if resume else 0
+    JOURNAL = Journal(journal_path)
+    snapshots = SnapshotStore('snapshots')  # script, config and Adaptives stored once, session keeps only hash
+    snapshot = snapshots.snapshot(session_files(ver))
+    if resume:  # rows of resumed session are appended to crashed one, so it is compacted as a whole
+        SESSION_ID = REGISTRY.resume_session(info['PART_ID'], PART_ID, ver)
+        JOURNAL.append('resume', start=time.time(), idx=resumed['idx'] if resumed else None, trained=trained,
+                       snapshot=snapshot)
+        logging.info(f'Session resumed from trial: {resumed["idx"] if resumed else "before experiment"}, '
+                     f'training trials already done: {trained}')
+    else:
+        SESSION_ID = REGISTRY.start_session(info['PART_ID'], PART_ID, ver)
+        JOURNAL.append('session', part_id=PART_ID, ver=ver, start=time.time(), header=BEH_HEADER, snapshot=snapshot)
+    JOURNAL.commit()
+    snapshots.record_session(PART_ID, ver, snapshot, session_id=SESSION_ID)
+    snapshots.close()
+    logging.info(f'Code snapshot: {snapshot}')
 
     # %% == Sounds preparation
-    white_noise = sa.WaveObject.from_wave_file('white_noise.wav')
+    AUDIO = AudioEngine(sample_rate=conf.SAMPLING_RATE, block_size=conf.AUDIO_BLOCK_SIZE, clock=core.getTime)
+    AUDIO.start()
+    logging.info(f'Audio output latency: {AUDIO.output_latency * 1000:.2f} ms, block size: {conf.AUDIO_BLOCK_SIZE}')
+    white_noise = load_wave('white_noise.wav', sample_rate=conf.SAMPLING_RATE)
+    RENDERER = TrialRenderer(sample_rate=conf.SAMPLING_RATE)
+    SCHEDULER = TriggerScheduler(send=TRIGGERS.send_trigger, clock=core.getTime)
+    stim_pack = None
+    if os.path.exists(conf.STIM_PACK):
+        try:
+            stim_pack = StimPack(conf.STIM_PACK, ramp_shape=conf.RAMP)
+        except ValueError as err:  # e.g. pack built with other RAMP, tones are synthesised instead
+            logging.warning(f'Stim pack not used: {err}')
+    TONES = ToneBank(synth=partial(prepare_sound, ramp=conf.RAMP), max_size=conf.TONE_BANK_SIZE,
+                     sample_rate=conf.SAMPLING_RATE, transition_time=conf.FADEOUT_TIME / 1000.0, pack=stim_pack)
+    created = TONES.warm_up(tone_bank_keys(ver, conf))
+    logging.info(f'Tone bank warmed up with {created} tones, stim pack used: {stim_pack is not None}.')
+    prefetcher = Prefetcher(TONES)
     # %% == Labels preparation ==
     answer_label = {'cmp_vol': _('Volume: Answer Label'), 'cmp_freq': _('Freq: Answer Label'),
                     'cmp_dur': _('Dur: Answer Label')}[ver]
@@ -290,33 +451,47 @@ def main():
                                     color=conf.FONT_COLOR, height=conf.FONT_SIZE)
     answer_labels = [answer_label, answer2_label]
     fix_cross = visual.TextStim(win, text='+', color='red', pos=(0, 15))
+    LABELS = TextStimRegistry(win, lang=conf.LANG, translate=_)
+    LABELS.register([N_('Corr ans'), N_('Incorr ans'), N_('No ans')], font='Arial', color=conf.FONT_COLOR,
+                    height=conf.FONT_SIZE)
+    LABELS.register([N_('First tone higher'), N_('First tone lower'), N_('Learning: Next')], color=conf.FONT_COLOR,
+                    height=conf.FONT_SIZE, wrapWidth=conf.SCREEN_RES['width'])
+    info_msgs = INFO_MSGS[ver]
+    LABELS.register(info_msgs.values(), font='arial', color='white', height=20, wrapWidth=1000)  # show_info defaults
     fix_cross.setAutoDraw(True)
     # %% == Learning phase ==
-    if ver == TrialType.CMP_FREQ:
-        show_info(win=win, msg=_('Freq: hello, before learning'))
+    if ver == TrialType.CMP_FREQ and not resume:
+        show_info(win=win, msg=info_msgs['hello, before learning'])
         core.wait(conf.TRAIN_SOUND_TIME / 1000.0)
         for idx, soa in enumerate(conf.LEARNING_SOAS, start=1):
             present_learning_sample(
                 win, idx, soa, conf.STANDARD_FREQ, white_noise, conf=conf)
             check_exit()
-        show_info(win=win, msg=_('Freq: hello, after learning'))
+        show_info(win=win, msg=info_msgs['hello, after learning'])
 
     # %% === Training ===
     training = list()
     for train_desc in conf.TRAINING:  # Training trials preparation
         training.append([train_desc['soa']] * train_desc['reps'])
-    msg = {'cmp_vol': _('Volume: before training'), 'cmp_freq': _('Freq: before training'),
-           'cmp_dur': _("Dur: before training")}[ver]
-    show_info(win=win, msg=msg)
+    if resumed:  # experiment phase was reached, so training is already done
+        training = list()
+    elif trained < sum(len(level) for level in training):
+        show_info(win=win, msg=info_msgs['before training'])
     for lab in answer_labels:
         lab.setAutoDraw(True)
     win.flip()
+    idx = len(training)
+    trial_no = 0
     for idx, level in enumerate(training, 1):
         for soa in level:
+            trial_no += 1
+            if trial_no <= trained:  # journaled before crash, rows are already in session
+                continue
             rt, corr, key, sf, sh = run_trial(
                 win, ver, soa, conf, white_noise, answer_labels, feedback=True)
-            RESULTS.append([PART_ID, idx, ver, 'train', key,
-                           int(corr), soa, '-', '-', '-', rt, sf, sh])
+            JOURNAL.append('trial', row=[PART_ID, idx, ver, 'train', key, int(corr), soa, '-', '-', '-', rt, sf, sh,
+                                         '-'])
+            JOURNAL.commit()  # trial row and its triggers, group commit in break
             core.wait(conf.BREAK / 1000.0)
             core.wait(random.choice(
                 range(*conf.JITTER_RANGE)) / 1000.0)  # jitter
@@ -324,41 +499,52 @@ def main():
         lab.setAutoDraw(False)
     win.flip()
     # %% == Experiment ==
-    msg = {'cmp_vol': _('Volume: before experiment'), 'cmp_freq': _('Freq: before experiment'),
-           'cmp_dur': _('Dur: before experiment')}[ver]
-    show_info(win=win, msg=msg)
-    experiment = NUpNDownMinIters(n_up=conf.N_UP, n_down=conf.N_DOWN, start_val=conf.START_SOA, max_revs=conf.MAX_REVS,
-                                  step_up=conf.STEP_UP, step_down=conf.STEP_DOWN, min_iters=conf.MIN_TRIALS)
-    old_rev_count_val = -1
+    show_info(win=win, msg=info_msgs['before experiment'])
+    experiment = build_tracks(conf)
+    old_rev_count_val = {name: -1 for name in experiment.tracks}  # per track
+    if resumed:
+        experiment.restore(resumed['state'])
+        old_rev_count_val = resumed['old_rev_count_val']
+        idx = resumed['idx'] + 1
     for lab in answer_labels:
         lab.setAutoDraw(True)
     win.flip()
     for idx, soa in enumerate(experiment, idx):
         rt, corr, key, sf, sh = run_trial(
             win, ver, soa, conf, white_noise, answer_labels, feedback=False)
+        # both possible next levels are synthesised during break and jitter
+        track = experiment.curr_track
+        staircase = experiment.tracks[track]
+        next_levels = {max(soa - staircase.step_up, 0), soa + staircase.step_down}
+        prefetcher.request(tone for lvl in next_levels for tone in trial_tone_keys(ver, lvl, conf))
         experiment.set_corr(bool(corr))
         level, reversal, revs_count = map(int, experiment.get_jump_status())
 
-        # Only first occurrence of revs_count should be in conf, otherwise '-'.
-        if old_rev_count_val != revs_count:
-            old_rev_count_val = revs_count
+        # Only first occurrence of revs_count (in track) should be in conf, otherwise '-'.
+        if old_rev_count_val[track] != revs_count:
+            old_rev_count_val[track] = revs_count
             rev_count_val = revs_count
         else:
             rev_count_val = '-'
 
-        RESULTS.append([PART_ID, idx, ver, 'exp', key, int(
-            corr), soa, reversal, level, rev_count_val, rt, sf, sh])
-        if idx == conf.MAX_TRIALS:
-            break
+        JOURNAL.append('trial', row=[PART_ID, idx, ver, 'exp', key, int(corr), soa, reversal, level, rev_count_val,
+                                     rt, sf, sh, track])
+        JOURNAL.append('staircase', idx=idx, state=experiment.snapshot(), old_rev_count_val=old_rev_count_val)
+        JOURNAL.commit()
         core.wait(conf.BREAK / 1000.0)
         core.wait(random.choice(range(*conf.JITTER_RANGE)) / 1000.0)  # jitter
     # %% == Clear experiment
-    msg = {'cmp_vol': _('Volume: end'), 'cmp_freq': _(
-        'Freq: end'), 'cmp_dur': _('Dur: end')}[ver]
+    prefetcher.close()
+    logging.info(f'Tone bank hits: {TONES.hits}, misses: {TONES.misses}, prefetched: {prefetcher.prefetched}.')
     for lab in answer_labels:
         lab.setAutoDraw(False)
     win.flip()
-    show_info(win, msg=msg)
+    show_info(win, msg=info_msgs['end'])
+    REGISTRY.set_state(SESSION_ID, COMPLETE)
+    logging.info(f'Audio underflows: {AUDIO.underflows}')
+    logging.info(f'Trigger to sound latency [s]: {SCHEDULER.latency_stats()}')
+    SCHEDULER.close()
+    AUDIO.close()
     win.close()
     core.quit()
     quit()
@@ -387,22 +573,11 @@ def run_trial(win: visual.Window, trial_type: TrialType, soa: int, conf: Dict2Ob
     t2: float = stim_time
     soa: float = random.choice([-soa, soa])
     timeout: bool = True
-    sample_rate = conf.SAMPLING_RATE
     corr: bool = False
-    timer: core.CountdownTimer = core.CountdownTimer()
-    response_clock: core.Clock = core.Clock()
-    first_sound = prepare_sound(freq=conf.STANDARD_FREQ, sound_time=stim_time)
-    second_sound = prepare_sound(freq=conf.STANDARD_FREQ, sound_time=stim_time)
     TRIGGERS.set_curr_trial_start()
-    corr_feedback_label = _('Corr ans')
-    corr_feedback_label = visual.TextStim(win, text=corr_feedback_label, font='Arial', color=conf.FONT_COLOR,
-                                          height=conf.FONT_SIZE)
-    incorr_feedback_label = _('Incorr ans')
-    incorr_feedback_label = visual.TextStim(win, text=incorr_feedback_label, font='Arial', color=conf.FONT_COLOR,
-                                            height=conf.FONT_SIZE)
-    noans_feedback_label = _('No ans')
-    noans_feedback_label = visual.TextStim(win, text=noans_feedback_label, font='Arial', color=conf.FONT_COLOR,
-                                           height=conf.FONT_SIZE)
+    corr_feedback_label = LABELS.get('Corr ans')
+    incorr_feedback_label = LABELS.get('Incorr ans')
+    noans_feedback_label = LABELS.get('No ans')
     standard_first = random.choice([True, False])
     standard_higher = soa < 0  # in freq/loudness/duration
     if trial_type == TrialType.CMP_FREQ:
@@ -412,8 +587,8 @@ def run_trial(win: visual.Window, trial_type: TrialType, soa: int, conf: Dict2Ob
         msg = f'Stadard freq: {standard_freq}, Comparsion_freq: {comparison_freq}'
         logging.info(msg)
         print(msg, end='=>')
-        standard = prepare_sound(freq=standard_freq, sound_time=t1)
-        comparison = prepare_sound(freq=comparison_freq, sound_time=t2)
+        standard = TONES.get(freq=standard_freq, sound_time=t1)
+        comparison = TONES.get(freq=comparison_freq, sound_time=t2)
         if standard_first:
             first_sound, second_sound = standard, comparison
         else:
@@ -422,8 +597,8 @@ def run_trial(win: visual.Window, trial_type: TrialType, soa: int, conf: Dict2Ob
         standard_first = True  # first sound is always this same
         t1 = conf.TIME / 1000.0
         t2 = (conf.TIME + soa) / 1000.0
-        first_sound = prepare_sound(freq=conf.STANDARD_FREQ, sound_time=t1)
-        second_sound = prepare_sound(freq=conf.STANDARD_FREQ, sound_time=t2)       
+        first_sound = TONES.get(freq=conf.STANDARD_FREQ, sound_time=t1)
+        second_sound = TONES.get(freq=conf.STANDARD_FREQ, sound_time=t2)
         msg = f"Time1: {t1}, Time2:{t2}."
         logging.info(msg)
         print(msg, end='=>')
@@ -434,45 +609,39 @@ def run_trial(win: visual.Window, trial_type: TrialType, soa: int, conf: Dict2Ob
     logging.info(f'TrialType: {trial_type}')
     msg = f"Standard is f{'first' if standard_first else 'second'} and {'higher' if standard_higher else 'lower'}"
     logging.info(msg)
-    # == Phase 1: White noise
-    play_obj = fix_sound.play()
-    play_obj.wait_done()
-    core.wait(2 * conf.BREAK / 1000.0)
-
-    # == Phase 2: Stimuli presentation
-    play_obj = sa.play_buffer(first_sound, 1, 2, sample_rate)
-    TRIGGERS.send_trigger(TriggerTypes.STIM_1_START)
-    play_obj.wait_done()
-    TRIGGERS.send_trigger(TriggerTypes.STIM_1_END)
-    time.sleep(conf.BREAK / 1000.0)
+    # == Phase 1: Whole trial sound (white noise, stimuli and breaks between them) played at once
+    timeline, onsets = RENDERER.render([('noise', fix_sound), 2 * conf.BREAK / 1000.0, ('stim_1', first_sound),
+                                        conf.BREAK / 1000.0, ('stim_2', second_sound)])
+    # stimuli triggers are fired by audio callback, when their first/last sample is played
+    markers = [(onsets[name], SCHEDULER.marker(trigger)) for name, trigger in
+               [('stim_1_start', TriggerTypes.STIM_1_START), ('stim_1_end', TriggerTypes.STIM_1_END),
+                ('stim_2_start', TriggerTypes.STIM_2_START)]]
+    voice = AUDIO.play(timeline, markers=markers)
+    onset_times = RENDERER.onset_times(onsets, start_time=voice.wait_started())
+    logging.info(f'Trial sound scheduled at: {voice.scheduled_time}, started at: {voice.start_time}')
+
+    # == Phase 2: Stimuli presentation, RT zero derived from audio clock
+    RESPONSES.set_rt_zero(onset_times['stim_2_start'])
+    wait_until(onset_times['stim_2_start'])
     event.clearEvents()
-
-    # make trigger, start of a sound and response timer in sync through win.flip()
-    win.callOnFlip(sa.play_buffer, second_sound, 1, 2, sample_rate)
-    win.callOnFlip(response_clock.reset)
-    win.callOnFlip(TRIGGERS.send_trigger, TriggerTypes.STIM_2_START)
-    win.callOnFlip(timer.reset, t2)
-    win.flip()  # sound played, clocks reset, trig sent
+    RESPONSES.clear()
     check_exit()
-    while timer.getTime() > 0:  # Handling responses when sounds still playing
-        key = event.getKeys(
-            keyList=[conf.FIRST_SOUND_KEY, conf.SECOND_SOUND_KEY])
-        if key:
-            rt = response_clock.getTime()
-            TRIGGERS.send_trigger(TriggerTypes.ANSWERED)
-            timeout = False
-            win.flip()
-            break
-    TRIGGERS.send_trigger(TriggerTypes.STIM_2_END)
+    # Handling responses when sounds still playing, collector sleeps between polls
+    response = RESPONSES.wait(max_wait=onset_times['stim_2_end'] - core.getTime())
+    if response:
+        SCHEDULER.send_now(TriggerTypes.ANSWERED)
+        timeout = False
+        win.flip()
+    SCHEDULER.send_now(TriggerTypes.STIM_2_END)
 
     # Phase 3: No reaction while stimuli presented
-    if not key:  # no reaction when sound was played, wait some more.
-        key = event.waitKeys(maxWait=conf.RTIME / 1000.0,
-                             keyList=[conf.FIRST_SOUND_KEY, conf.SECOND_SOUND_KEY])
-        if key:  # check if any reaction, if no - timeout
-            rt = response_clock.getTime()
+    if not response:  # no reaction when sound was played, wait some more.
+        response = RESPONSES.wait(max_wait=conf.RTIME / 1000.0)
+        if response:  # check if any reaction, if no - timeout
             timeout = False
-            TRIGGERS.send_trigger(TriggerTypes.ANSWERED)
+            SCHEDULER.send_now(TriggerTypes.ANSWERED)
+    if response:
+        key, rt = [response[0]], response[1]
 
     # Phase 4: Timeout handling
 
@@ -495,7 +664,10 @@ def run_trial(win: visual.Window, trial_type: TrialType, soa: int, conf: Dict2Ob
         rt = -1.0
         feedback_label = noans_feedback_label
         corr = False
+    SCHEDULER.flush()
     TRIGGERS.add_info_to_last_trigger(dict(corr=corr, key=key[0]), how_many=-1)
+    for trigger_type, value, sent_time in SCHEDULER.pop_sent():  # committed by caller together with trial row
+        JOURNAL.append('trigger', trigger_type=trigger_type, value=value, corr=corr, key=key[0], time=sent_time)
 
     if feedback:
         feedback_label.draw()
@@ -1,7 +1,10 @@
 # import parallel
+import wave
 
 import numpy as np
 
+from misc.synth import ToneSynth, wave_blocks
+
 
 class Dict2Obj(object):
     """
@@ -25,8 +28,8 @@ def get_sine_wave(freq: int, sampling_rate: int, wave_length: int, wsf: int = 32
     :return: Sine-wave with given freq.
     """
     sound_time = wave_length / 1000.0
-    res = wsf * np.sin(2 * np.pi * np.arange(sampling_rate * sound_time) * freq / sampling_rate)
-    return res.astype(np.int16)
+    return ToneSynth().render(freq, sound_time, sample_rate=sampling_rate, transition_time=0, wsf=wsf,
+                              normalize=False)
 
 
 def get_white_noise(mean: int, sampling_rate: int, wave_length: int, std: int = 1, wsf: int = 32768) -> np.array:
@@ -41,4 +44,20 @@ def get_white_noise(mean: int, sampling_rate: int, wave_length: int, std: int =
     """
     sound_time = wave_length // 1000
     res = wsf * np.random.normal(mean, std, size=sound_time * sampling_rate)
-    return res.astype(np.int16)
\ No newline at end of file
+    return res.astype(np.int16)
+
+
+def load_wave(path: str, sample_rate: int) -> np.array:
+    """
+    Load whole 16-bit PCM WAVE file, e.g. white noise separator, for AudioEngine.
+    Samples are played as they are (no resampling or downmix), so file must match session stream.
+    :param path: WAVE file.
+    :param sample_rate: Sampling rate of session stream.
+    :return: int16 samples.
+    """
+    with wave.open(path, 'rb') as wav:
+        params = (wav.getframerate(), wav.getnchannels(), wav.getsampwidth())
+    if params != (sample_rate, 1, 2):
+        raise ValueError(f'{path} must be mono 16-bit PCM at {sample_rate} Hz, it is {params[1]} channel(s), '
+                         f'{8 * params[2]}-bit at {params[0]} Hz.')
+    return np.concatenate(list(wave_blocks(path, block_size=65536)) or [np.empty(0, dtype=np.int16)])
@@ -0,0 +1,169 @@
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+import sounddevice as sd
+
+
+Marker = Tuple[int, Callable[[float], None]]
+
+
+class Voice(object):
+    """
+    Handle of buffer scheduled in AudioEngine.
+    All times are in engine clock (see AudioEngine.clock), same as clock used by rest of procedure.
+    """
+
+    def __init__(self, engine: 'AudioEngine', audio: np.ndarray, start_sample: int, scheduled_time: Optional[float],
+                 markers: List[Marker] = ()):
+        self.engine = engine
+        self.audio = audio
+        self.start_sample = start_sample
+        self.end_sample = start_sample + len(audio)
+        self.markers = sorted(markers, key=lambda marker: marker[0])
+        self._next_marker = 0
+        self.scheduled_time = scheduled_time  # estimated at scheduling, None before first audio callback
+        self.start_time = None  # time when first sample reaches DAC, set by audio callback
+        self._started = threading.Event()
+        self._queued = threading.Event()
+
+    @property
+    def duration(self) -> float:
+        return len(self.audio) / self.engine.sample_rate
+
+    def wait_started(self, timeout: float = None) -> float:
+        """
+        Block until first sample is passed to sound card.
+        :return: Time when first sample reaches DAC.
+        """
+        self._started.wait(timeout)
+        return self.start_time
+
+    def wait_done(self) -> None:
+        """
+        Block until last sample is played by DAC.
+        """
+        self._queued.wait()
+        remaining = self.start_time + self.duration - self.engine.clock()
+        if remaining > 0:
+            time.sleep(remaining)
+
+
+class AudioEngine(object):
+    """
+    One low latency output stream for whole session. Scheduled buffers are mixed into stream
+    in audio callback, so no stream is opened per sound and start of every buffer is known
+    with sample accuracy.
+
+    Usage:
+
+    ```
+    engine = AudioEngine(sample_rate=44100, block_size=128, clock=core.getTime)
+    engine.start()
+    voice = engine.play(audio)
+    onset = voice.wait_started()
+    voice.wait_done()
+    engine.close()
+    ```
+    """
+
+    def __init__(self, sample_rate: int = 44100, block_size: int = 128, latency: str = 'low',
+                 clock: Callable[[], float] = time.perf_counter):
+        """
+        :param sample_rate: Stream sample rate, all buffers must have this same rate.
+        :param block_size: Frames per audio callback, smaller means lower latency and higher CPU load.
+        :param latency: PortAudio latency setting ('low', 'high' or value in s).
+        :param clock: Clock used for returned timestamps, psychopy core.getTime usually.
+        """
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.latency = latency
+        self.clock = clock
+        self.stream = None
+        self.underflows = 0
+        self._voices: List[Voice] = list()
+        self._lock = threading.Lock()
+        self._mix = np.zeros(block_size, dtype=np.int32)
+        self._frames = 0  # frames rendered before current callback
+        self._last_block_frame = 0
+        self._last_dac_time = None
+        self._clock_offset = 0.0
+
+    def start(self) -> None:
+        self.stream = sd.OutputStream(samplerate=self.sample_rate, blocksize=self.block_size, channels=1,
+                                      dtype='int16', latency=self.latency, callback=self._callback)
+        self.stream.start()
+        self._clock_offset = self.clock() - self.stream.time
+
+    def close(self) -> None:
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+    @property
+    def output_latency(self) -> float:
+        return self.stream.latency
+
+    def to_clock(self, stream_time: float) -> float:
+        """
+        Convert PortAudio stream time to engine clock.
+        """
+        return stream_time + self._clock_offset
+
+    def play(self, audio: np.ndarray, delay: float = 0.0, markers: List[Marker] = ()) -> Voice:
+        """
+        Schedule mono int16 buffer. Start is always at least one block ahead of currently rendered one,
+        so buffer is never cut at the beginning.
+        :param audio: Samples, not copied, must not be modified until played.
+        :param delay: Additional delay [in s].
+        :param markers: (sample offset in audio, func) pairs. Func is called from audio callback, when block with
+                        marked sample is rendered, with time when that sample reaches DAC. It must not block.
+        :return: Voice handle with scheduled start time.
+        """
+        with self._lock:
+            start_sample = self._frames + self.block_size + int(round(delay * self.sample_rate))
+            scheduled_time = None
+            if self._last_dac_time is not None:
+                stream_time = self._last_dac_time + (start_sample - self._last_block_frame) / self.sample_rate
+                scheduled_time = self.to_clock(stream_time)
+            voice = Voice(self, audio, start_sample, scheduled_time, markers)
+            self._voices.append(voice)
+        return voice
+
+    def _callback(self, outdata, frames, time_info, status) -> None:
+        if status.output_underflow:
+            self.underflows += 1
+        block_start, block_end = self._frames, self._frames + frames
+        mix = self._mix[:frames]
+        mix[:] = 0
+        with self._lock:
+            dac_time = time_info.outputBufferDacTime
+            self._last_dac_time, self._last_block_frame = dac_time, block_start
+            finished = list()
+            for voice in self._voices:
+                if voice.start_sample >= block_end:
+                    continue
+                lo, hi = max(voice.start_sample, block_start), min(voice.end_sample, block_end)
+                if hi > lo:
+                    mix[lo - block_start:hi - block_start] += voice.audio[lo - voice.start_sample:hi - voice.start_sample]
+                if not voice._started.is_set():
+                    voice.start_time = self.to_clock(dac_time + (voice.start_sample - block_start) / self.sample_rate)
+                    voice._started.set()
+                while voice._next_marker < len(voice.markers):
+                    offset, func = voice.markers[voice._next_marker]
+                    if voice.start_sample + offset >= block_end:
+                        break
+                    func(voice.start_time + offset / self.sample_rate)
+                    voice._next_marker += 1
+                if voice.end_sample <= block_end:
+                    finished.append(voice)
+            for voice in finished:
+                for offset, func in voice.markers[voice._next_marker:]:  # markers at the very end of buffer
+                    func(voice.start_time + offset / self.sample_rate)
+                self._voices.remove(voice)
+                voice._queued.set()
+            self._frames = block_end
+        np.clip(mix, -32768, 32767, out=mix)
+        outdata[:, 0] = mix
@@ -0,0 +1,84 @@
+"""
+Minimal BioSemi BDF reader for trigger checks. Only header is parsed, data records are memory mapped
+and only bytes of status channel are touched, chunk by chunk, so recording is never loaded as a whole.
+"""
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+
+class BdfStatus(object):
+    """
+    Status (trigger) channel of BDF file.
+
+    Usage:
+
+    ```
+    status = BdfStatus('session.bdf')
+    onsets, codes = status.events()
+    onsets / status.sample_rate  # onset times [in s]
+    ```
+    """
+
+    def __init__(self, path: str, channel: str = 'Status'):
+        """
+        :param path: BDF file.
+        :param channel: Label of status channel.
+        """
+        self.path = path
+        with open(path, 'rb') as bdf_file:
+            header = bdf_file.read(256)
+            if header[1:8] != b'BIOSEMI':
+                raise ValueError(f'{path} is not a BDF file.')
+            self.header_bytes = int(header[184:192])
+            self.n_records = int(header[236:244])
+            self.record_duration = float(header[244:252])
+            n_signals = int(header[252:256])
+            signals = bdf_file.read(256 * n_signals)
+        labels = self._field(signals, n_signals, 0, 16)
+        offset = n_signals * (16 + 80 + 8 + 8 + 8 + 8 + 8 + 80)  # label ... prefiltering
+        samples = [int(val) for val in self._field(signals, n_signals, offset, 8)]
+        if channel not in labels:
+            raise ValueError(f'No {channel} channel in {path}, channels: {labels}.')
+        idx = labels.index(channel)
+        self.samples_per_record = samples[idx]
+        self.sample_rate = self.samples_per_record / self.record_duration
+        self.record_bytes = 3 * sum(samples)
+        self._status_slice = slice(3 * sum(samples[:idx]), 3 * sum(samples[:idx + 1]))
+        if self.n_records < 0:  # -1 when recording wasn't closed properly, count from file size
+            self.n_records = (self._file_size() - self.header_bytes) // self.record_bytes
+        self._data = np.memmap(path, dtype=np.uint8, mode='r', offset=self.header_bytes,
+                               shape=(self.n_records, self.record_bytes))
+
+    @staticmethod
+    def _field(signals: bytes, n_signals: int, offset: int, width: int) -> List[str]:
+        return [signals[offset + i * width:offset + (i + 1) * width].decode('ascii').strip() for i in range(n_signals)]
+
+    def _file_size(self) -> int:
+        with open(self.path, 'rb') as bdf_file:
+            return bdf_file.seek(0, 2)
+
+    def chunks(self, records_per_chunk: int = 1024, mask: int = 0xFFFF) -> Iterator[np.ndarray]:
+        """
+        Status channel values, masked, in chunks of **records_per_chunk** data records.
+        """
+        for start in range(0, self.n_records, records_per_chunk):
+            raw = self._data[start:start + records_per_chunk, self._status_slice].reshape(-1, 3).astype(np.int32)
+            yield (raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)) & mask
+
+    def events(self, records_per_chunk: int = 1024, mask: int = 0xFFFF) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Trigger onsets: samples where status changes to non zero value (like mne.find_events).
+        :return: Onset sample indices and trigger codes.
+        """
+        onsets, codes = list(), list()
+        prev, pos = 0, 0
+        for values in self.chunks(records_per_chunk, mask):
+            changed = np.flatnonzero(np.diff(values, prepend=prev) != 0)
+            changed = changed[values[changed] != 0]
+            onsets.append(changed + pos)
+            codes.append(values[changed])
+            prev, pos = values[-1], pos + len(values)
+        if not onsets:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+        return np.concatenate(onsets).astype(np.int64), np.concatenate(codes)
@@ -0,0 +1,136 @@
+"""
+Vectorized percentile bootstrap of staircase thresholds. Resample indices of whole chunk are drawn as one
+(resamples, trials) matrix, and thresholds of all resamples in chunk are computed at once: reversal means as
+row means, Weibull fits as one matrix product of per-level answer counts with log likelihood table of WeibullGrid
+(computed once per session), followed by argmax over grid. chunk_size bounds memory, which is about
+chunk_size * (trials + thresholds * slopes) * 8 bytes.
+
+Benchmark against Python loop bootstrap:
+
+    python -m misc.bootstrap
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+
+from misc.psychometric import WeibullGrid
+
+
+def resample_indices(rng: np.random.Generator, n: int, n_boot: int) -> np.ndarray:
+    """
+    :return: Int array (n_boot, n), every row is one resample (with replacement) of range(n).
+    """
+    return rng.integers(0, n, size=(n_boot, n))
+
+
+def chunks(n_boot: int, chunk_size: int):
+    for start in range(0, n_boot, chunk_size):
+        yield start, min(start + chunk_size, n_boot)
+
+
+def reversal_means(rev_levels: np.ndarray, n_boot: int, rng: np.random.Generator,
+                   chunk_size: int = 1024) -> np.ndarray:
+    """
+    :return: n_boot reversal-mean thresholds of resampled reversal levels, NaN if there are no reversals.
+    """
+    rev_levels = np.asarray(rev_levels, dtype=np.float64)
+    if not len(rev_levels):
+        return np.full(n_boot, np.nan)
+    means = np.empty(n_boot)
+    for start, stop in chunks(n_boot, chunk_size):
+        means[start:stop] = rev_levels[resample_indices(rng, len(rev_levels), stop - start)].mean(axis=1)
+    return means
+
+
+def fitted_thresholds(levels: np.ndarray, corr: np.ndarray, grid: WeibullGrid, target_p: float, n_boot: int,
+                      rng: np.random.Generator, chunk_size: int = 256) -> np.ndarray:
+    """
+    :return: n_boot fitted thresholds (levels at **target_p**) of resampled trials.
+    """
+    distinct, inverse = np.unique(np.asarray(levels, dtype=np.float64), return_inverse=True)
+    corr = np.asarray(corr, dtype=np.float64)
+    n_levels = len(distinct)
+    p = grid.p_corr(distinct)  # (thresholds, slopes, levels)
+    log_q = np.log1p(-p).reshape(-1, n_levels).T  # (levels, grid)
+    log_odds = np.log(p).reshape(-1, n_levels).T - log_q
+    grid_thresholds = np.repeat(grid.thresholds, len(grid.slopes))
+    grid_slopes = np.tile(grid.slopes, len(grid.thresholds))
+    fitted = np.empty(n_boot)
+    for start, stop in chunks(n_boot, chunk_size):
+        size = stop - start
+        idx = resample_indices(rng, len(inverse), size)
+        bins = (inverse[idx] + n_levels * np.arange(size)[:, None]).ravel()  # level bin of every trial, per row
+        n_trials = np.bincount(bins, minlength=size * n_levels).reshape(size, n_levels)
+        n_corr = np.bincount(bins, weights=corr[idx].ravel(), minlength=size * n_levels).reshape(size, n_levels)
+        best = np.argmax(n_corr @ log_odds + n_trials @ log_q, axis=1)
+        fitted[start:stop] = grid.level_for(target_p, grid_thresholds[best], grid_slopes[best])
+    return fitted
+
+
+def percentile_ci(samples: np.ndarray, ci: float = 0.95) -> Tuple[float, float]:
+    if np.isnan(samples).all():
+        return np.nan, np.nan
+    low, high = np.nanpercentile(samples, [50 * (1 - ci), 50 * (1 + ci)])
+    return float(low), float(high)
+
+
+def bootstrap(levels: np.ndarray, corr: np.ndarray, reversals: np.ndarray, grid: WeibullGrid, target_p: float,
+              n_boot: int = 1000, discard_revs: int = 0, ci: float = 0.95, seed: int = None,
+              chunk_size: int = 256) -> Dict[str, float]:
+    """
+    Percentile bootstrap CIs of reversal-mean threshold (reversal levels resampled) and of fitted threshold at
+    **target_p** (trials resampled).
+    :return: Dict with rev_ci_low, rev_ci_high, fit_ci_low, fit_ci_high.
+    """
+    rng = np.random.default_rng(seed)
+    levels = np.asarray(levels, dtype=np.float64)
+    rev_levels = levels[np.asarray(reversals, dtype=bool)][discard_revs:]
+    rev_low, rev_high = percentile_ci(reversal_means(rev_levels, n_boot, rng, chunk_size=4 * chunk_size), ci)
+    fit_low, fit_high = percentile_ci(fitted_thresholds(levels, corr, grid, target_p, n_boot, rng,
+                                                        chunk_size=chunk_size), ci)
+    return dict(rev_ci_low=rev_low, rev_ci_high=rev_high, fit_ci_low=fit_low, fit_ci_high=fit_high)
+
+
+def naive_bootstrap(levels: np.ndarray, corr: np.ndarray, reversals: np.ndarray, grid: WeibullGrid, target_p: float,
+                    n_boot: int = 1000, discard_revs: int = 0, ci: float = 0.95, seed: int = None) -> Dict[str, float]:
+    """
+    Reference implementation, one resample and one fit per loop iteration.
+    """
+    rng = np.random.default_rng(seed)
+    levels, corr = np.asarray(levels, dtype=np.float64), np.asarray(corr, dtype=bool)
+    rev_levels = levels[np.asarray(reversals, dtype=bool)][discard_revs:]
+    rev_boot, fit_boot = np.full(n_boot, np.nan), np.full(n_boot, np.nan)
+    for idx in range(n_boot):
+        if len(rev_levels):
+            rev_boot[idx] = rng.choice(rev_levels, len(rev_levels)).mean()
+        sample = rng.integers(0, len(levels), len(levels))
+        threshold, slope = grid.fit(levels[sample], corr[sample])
+        fit_boot[idx] = grid.level_for(target_p, threshold, slope)
+    rev_low, rev_high = percentile_ci(rev_boot, ci)
+    fit_low, fit_high = percentile_ci(fit_boot, ci)
+    return dict(rev_ci_low=rev_low, rev_ci_high=rev_high, fit_ci_low=fit_low, fit_ci_high=fit_high)
+
+
+if __name__ == '__main__':
+    import time
+
+    from Adaptives.BatchNUpNDownMinIters import PsychometricObserver, convergence_p
+    from Adaptives.NUpNDownMinIters import NUpNDownMinIters
+
+    # one simulated cmp_freq session, 3-up/1-down, 200 trials
+    observer = PsychometricObserver(threshold=5, seed=0)
+    staircase = NUpNDownMinIters(n_up=3, n_down=1, max_revs=14, start_val=8, min_iters=200)
+    levels, corr, reversals = list(), list(), list()
+    for level in staircase:
+        answer = bool(observer.answer(level))
+        staircase.set_corr(answer)
+        levels.append(level)
+        corr.append(answer)
+        reversals.append(staircase.get_jump_status()[1])
+    grid = WeibullGrid(max_level=1.5 * max(levels))
+    target_p = convergence_p(3, 1)
+    for name, func, kwargs in [('naive', naive_bootstrap, dict()), ('vectorized', bootstrap, dict()),
+                               ('vectorized, chunk_size=32', bootstrap, dict(chunk_size=32))]:
+        start = time.perf_counter()
+        cis = func(levels, corr, reversals, grid, target_p, n_boot=2000, seed=1, **kwargs)
+        print(f'{name}: {time.perf_counter() - start:.2f} s', {key: round(val, 3) for key, val in cis.items()})
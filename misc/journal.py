@@ -0,0 +1,191 @@
+"""
+Append-only session journal. Every trial row and trigger record is one JSON line, written to disk
+(and fsynced) in small groups between trials, so hard crash or power loss costs at most one trial.
+At the end of session journal is compacted into usual _beh.csv and _triggermap.csv files.
+
+Recovery of crashed session, writes beh and triggermap files into results dir of given journal:
+
+    python -m misc.journal cmp_freq_results/journal/<PART_ID>.jsonl
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from os.path import dirname, join
+from typing import Dict, List, Optional
+
+
+class Journal(object):
+    """
+    Records are buffered by append() and written with one write and fsync by commit() (group commit),
+    which should be called when nothing time critical is going on, e.g. in break between trials.
+
+    Usage:
+
+    ```
+    journal = Journal(join(RES_DIR, 'journal', PART_ID + '.jsonl'))
+    journal.append('session', part_id=PART_ID, header=header)
+    journal.append('trial', row=row)
+    journal.commit()
+    journal.close()
+    ```
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Journal file, opened for appending, created with its directory if missing.
+        """
+        self.path = path
+        os.makedirs(dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._pending: List[str] = list()
+
+    def append(self, kind: str, **fields) -> None:
+        """
+        Buffer one record, no disk access.
+        :param kind: Record type: 'session', 'trial', 'trigger' etc.
+        :param fields: JSON serializable record content.
+        """
+        self._pending.append(json.dumps(dict(kind=kind, **fields)))
+
+    def commit(self) -> int:
+        """
+        Write all buffered records and fsync them.
+        :return: No of records written.
+        """
+        if not self._pending or self._file.closed:
+            return 0
+        self._file.write('\n'.join(self._pending) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        written, self._pending = len(self._pending), list()
+        return written
+
+    def close(self) -> None:
+        self.commit()
+        self._file.close()
+
+
+def read_journal(path: str) -> List[Dict]:
+    """
+    All records of journal. Last line torn by crash during write is skipped.
+    """
+    records = list()
+    with open(path, 'r', encoding='utf-8') as journal_file:
+        lines = journal_file.read().split('\n')
+    for line_no, line in enumerate(lines, 1):
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            if line_no < len(lines) - 1:
+                raise
+    return records
+
+
+def last_session(records: List[Dict]) -> List[Dict]:
+    """
+    Records from last 'session' record on (journal file may hold many sessions of one participant).
+    """
+    starts = [idx for idx, record in enumerate(records) if record['kind'] == 'session']
+    return records[starts[-1]:] if starts else records
+
+
+def resume_point(journal_path: str) -> Optional[Dict]:
+    """
+    Place where journaled session stopped.
+    :param journal_path: Journal of crashed session.
+    :return: Last 'staircase' record (trial idx, staircase snapshot, old_rev_count_val),
+             None if session crashed before experiment phase.
+    """
+    staircase = [record for record in last_session(read_journal(journal_path)) if record['kind'] == 'staircase']
+    return staircase[-1] if staircase else None
+
+
+def training_done(journal_path: str) -> int:
+    """
+    No of training trials journaled in crashed session, resumed training starts after them.
+    """
+    return sum(1 for record in last_session(read_journal(journal_path))
+               if record['kind'] == 'trial' and record['row'][3] == 'train')
+
+
+def session_stamp(records: List[Dict]) -> str:
+    """
+    Timestamp of session start, used in names of compacted files, so compacting again (after resume or
+    recovery) overwrites files of this same session instead of adding new ones.
+    """
+    start = next(record['start'] for record in records if record['kind'] == 'session')
+    return time.strftime("%Y-%m-%d_%H_%M_%S", time.gmtime(start))
+
+
+def write_beh(records: List[Dict], path: str) -> int:
+    """
+    Compact session records into beh csv, header is taken from 'session' record.
+    :return: No of trial rows written.
+    """
+    header = next(record['header'] for record in records if record['kind'] == 'session')
+    rows = [record['row'] for record in records if record['kind'] == 'trial']
+    with open(path, 'w') as beh_file:
+        beh_writer = csv.writer(beh_file)
+        beh_writer.writerows([header] + rows)
+    return len(rows)
+
+
+def handler_log(path: str) -> List[str]:
+    """
+    TriggerHandler log lines ('# ...') of triggermap file, empty if there is no file.
+    """
+    if not os.path.exists(path):
+        return list()
+    with open(path, 'r') as trigger_file:
+        return [line for line in trigger_file.read().splitlines() if line.startswith('#')]
+
+
+def write_triggermap(records: List[Dict], path: str, trigger_limit: int = 60, log: List[str] = ()) -> int:
+    """
+    Compact session records into triggermap csv: value sent to EEG, trigger type, corr, key and send time
+    of every trigger, followed by TriggerHandler log lines, like in file saved by TriggerHandler.
+    :param trigger_limit: Used only for records without sent value (journals of older versions), values are then
+                          cycled 1..trigger_limit, from 1 again after every 'resume' record (new TriggerHandler).
+    :param log: TriggerHandler log lines of all runs of session.
+    :return: No of triggers written.
+    """
+    n_triggers, idx = 0, 0
+    with open(path + '.tmp', 'w') as trigger_file:
+        trigger_writer = csv.writer(trigger_file)
+        trigger_writer.writerow(['trigger_no', 'trigger_type', 'corr', 'key', 'send_time'])
+        for record in records:
+            if record['kind'] == 'resume':
+                idx = 0
+            elif record['kind'] == 'trigger':
+                value = record.get('value', idx % trigger_limit + 1)
+                trigger_writer.writerow([value, record['trigger_type'], record['corr'], record['key'],
+                                         record.get('time', '')])
+                idx += 1
+                n_triggers += 1
+        trigger_file.writelines(line + '\n' for line in log)
+    os.replace(path + '.tmp', path)  # log is often read from this same file
+    return n_triggers
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write beh and triggermap files of (crashed) session from journal.')
+    parser.add_argument('journal', help='Journal file, <ver>_results/journal/<PART_ID>.jsonl')
+    parser.add_argument('--trigger-limit', type=int, default=60)
+    args = parser.parse_args()
+
+    records = last_session(read_journal(args.journal))
+    res_dir = dirname(dirname(os.path.abspath(args.journal)))
+    part_id = records[0].get('part_id', os.path.basename(args.journal).rsplit('.', 1)[0])
+    stamp = session_stamp(records)
+    n_rows = write_beh(records, join(res_dir, 'beh', f'{part_id}_{stamp}_beh.csv'))
+    triggermap = join(res_dir, 'triggermaps', f'{part_id}_{stamp}_triggermap.csv')
+    n_triggers = write_triggermap(records, triggermap, trigger_limit=args.trigger_limit, log=handler_log(triggermap))
+    print(f'{n_rows} trials and {n_triggers} triggers recovered -> {res_dir}')
+
+
+if __name__ == '__main__':
+    main()
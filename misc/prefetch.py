@@ -0,0 +1,59 @@
+import queue
+import threading
+from typing import Iterable
+
+from misc.tone_bank import ToneBank, ToneKey
+
+
+class Prefetcher(object):
+    """
+    Background thread filling ToneBank ahead of time.
+    Tones for all possible next trials are requested while current one ends (break, jitter),
+    so run_trial only looks them up in bank.
+
+    Usage:
+
+    ```
+    prefetcher = Prefetcher(bank)
+    prefetcher.request(keys)
+    ...
+    prefetcher.close()
+    ```
+    """
+
+    def __init__(self, bank: ToneBank):
+        """
+        :param bank: Bank filled by prefetcher, the same one which is used by trials.
+        """
+        self.bank = bank
+        self.prefetched = 0
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='tone-prefetch', daemon=True)
+        self._thread.start()
+
+    def request(self, keys: Iterable[ToneKey]) -> None:
+        """
+        Queue tones for synthesis, returns immediately.
+        :param keys: (freq, duration, sample rate, ramp) tuples.
+        """
+        self._requests.put(list(keys))
+
+    def wait(self) -> None:
+        """
+        Block until all requested tones are in bank.
+        """
+        self._requests.join()
+
+    def close(self) -> None:
+        self._requests.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            keys = self._requests.get()
+            try:
+                if keys is None:
+                    return
+                self.prefetched += self.bank.warm_up(keys)
+            finally:
+                self._requests.task_done()
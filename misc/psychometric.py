@@ -0,0 +1,81 @@
+"""
+Threshold estimates of single staircase run: reversal-mean threshold and maximum likelihood fit of 2AFC Weibull
+psychometric function (same one as PsychometricObserver simulates). Fit is grid search over threshold and slope,
+log likelihood of all grid points is computed at once from answer counts per level, so it needs only NumPy.
+Bootstrap CIs of both are in misc.bootstrap.
+"""
+from typing import Tuple
+
+import numpy as np
+
+
+def reversal_threshold(levels: np.ndarray, reversals: np.ndarray, discard_revs: int = 0) -> float:
+    """
+    Mean level at reversals, like BatchNUpNDownMinIters threshold.
+    :param levels: Level (SOA) of every trial.
+    :param reversals: Bool, True where trial was reversal.
+    :param discard_revs: No of first reversals not used.
+    :return: Threshold, NaN if no reversal left.
+    """
+    rev_levels = np.asarray(levels, dtype=np.float64)[np.asarray(reversals, dtype=bool)][discard_revs:]
+    return float(rev_levels.mean()) if len(rev_levels) else np.nan
+
+
+class WeibullGrid(object):
+    def __init__(self, max_level: float, n_thresholds: int = 200, slopes: np.ndarray = None, guess_rate: float = 0.5,
+                 lapse_rate: float = 0.02):
+        """
+        p(corr) = guess_rate + (1 - guess_rate - lapse_rate) * (1 - exp(-(level / threshold) ** slope))
+
+        * :param **max_level**: Highest threshold in grid, thresholds are spread evenly in (0, max_level].
+        * :param **n_thresholds**: No of thresholds in grid.
+        * :param **slopes**: Slopes in grid, log-spaced 0.5..10 by default.
+        * :param **guess_rate**: Chance level, 0.5 for 2AFC.
+        * :param **lapse_rate**: Prob of error independent of level, fixed in fit.
+        """
+        self.thresholds = np.linspace(max_level / n_thresholds, max_level, n_thresholds)
+        self.slopes = np.geomspace(0.5, 10, 30) if slopes is None else np.asarray(slopes, dtype=np.float64)
+        self.guess_rate = guess_rate
+        self.lapse_rate = lapse_rate
+
+    def p_corr(self, levels: np.ndarray) -> np.ndarray:
+        """
+        :return: Array (thresholds, slopes, levels) of correct answer probs.
+        """
+        ratio = np.maximum(np.asarray(levels, dtype=np.float64), 0) / self.thresholds[:, None, None]
+        weibull = 1 - np.exp(-ratio ** self.slopes[None, :, None])
+        return self.guess_rate + (1 - self.guess_rate - self.lapse_rate) * weibull
+
+    def log_likelihood(self, levels: np.ndarray, n_corr: np.ndarray, n_trials: np.ndarray) -> np.ndarray:
+        """
+        :param levels: Distinct levels.
+        :param n_corr: Correct answers at every level, (..., levels), leading axes are kept.
+        :param n_trials: Trials at every level, broadcastable to n_corr.
+        :return: Array (..., thresholds, slopes).
+        """
+        p = self.p_corr(levels)
+        log_p, log_q = np.log(p), np.log1p(-p)
+        n_corr = np.asarray(n_corr, dtype=np.float64)
+        n_incorr = np.asarray(n_trials, dtype=np.float64) - n_corr
+        return np.einsum('...l,tsl->...ts', n_corr, log_p) + np.einsum('...l,tsl->...ts', n_incorr, log_q)
+
+    def level_for(self, p: float, threshold, slope):
+        """
+        Inverse of psychometric function, level at which answer is correct with prob **p**.
+        """
+        weibull = (p - self.guess_rate) / (1 - self.guess_rate - self.lapse_rate)
+        return threshold * (-np.log(1 - weibull)) ** (1 / slope)
+
+    def fit(self, levels: np.ndarray, corr: np.ndarray) -> Tuple[float, float]:
+        """
+        Maximum likelihood threshold and slope of single run.
+        :param levels: Level of every trial.
+        :param corr: Correctness of every trial.
+        """
+        distinct, inverse = np.unique(np.asarray(levels, dtype=np.float64), return_inverse=True)
+        n_trials = np.bincount(inverse, minlength=len(distinct))
+        n_corr = np.bincount(inverse, weights=np.asarray(corr, dtype=np.float64), minlength=len(distinct))
+        log_lik = self.log_likelihood(distinct, n_corr, n_trials)
+        t_idx, s_idx = np.unravel_index(np.argmax(log_lik), log_lik.shape)
+        return float(self.thresholds[t_idx]), float(self.slopes[s_idx])
+
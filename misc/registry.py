@@ -0,0 +1,180 @@
+"""
+Participant registry, one SQLite file shared by all procedures (cmp_dur, cmp_freq, cmp_vol).
+Every session is a row with participant name, PART_ID, procedure, timestamps and state, indexed by
+(name, procedure), so ID collision check doesn't depend on number of result files.
+
+Incomplete sessions:
+
+    python -m misc.registry --incomplete
+"""
+import argparse
+import calendar
+import os
+import re
+import sqlite3
+import time
+from os.path import join
+from typing import List, Optional
+
+RUNNING = 'running'
+COMPLETE = 'complete'
+ABORTED = 'aborted'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    part_id TEXT NOT NULL,
+    procedure TEXT NOT NULL,
+    started REAL NOT NULL,
+    updated REAL NOT NULL,
+    state TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_name_procedure ON sessions (name, procedure);
+CREATE INDEX IF NOT EXISTS sessions_state ON sessions (state);
+"""
+
+BEH_FILE = re.compile(r'^(.*)_(\d{4}-\d{2}-\d{2}_\d{2}_\d{2}_\d{2})_beh\.csv$')
+
+
+class ParticipantRegistry(object):
+    """
+    Usage:
+
+    ```
+    registry = ParticipantRegistry('participants.sqlite', backfill_dirs=['cmp_freq_results'])
+    if not registry.id_used(name, 'cmp_freq'):
+        session_id = registry.start_session(name, PART_ID, 'cmp_freq')
+    ...
+    registry.set_state(session_id, COMPLETE)
+    ```
+    """
+
+    def __init__(self, path: str = 'participants.sqlite', backfill_dirs: List[str] = ()):
+        """
+        :param path: Registry file, created if missing.
+        :param backfill_dirs: Results dirs (<ver>_results) of sessions run before registry existed,
+                              imported once, when registry file is created.
+        """
+        self.path = path
+        created = not os.path.exists(path)
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+        if created:
+            for res_dir in backfill_dirs:
+                self.backfill(res_dir)
+
+    def id_used(self, name: str, procedure: str) -> bool:
+        row = self.db.execute('SELECT 1 FROM sessions WHERE name = ? AND procedure = ? LIMIT 1', (name, procedure))
+        return row.fetchone() is not None
+
+    def start_session(self, name: str, part_id: str, procedure: str, state: str = RUNNING,
+                      started: float = None) -> int:
+        """
+        :return: Id of new session.
+        """
+        started = time.time() if started is None else started
+        with self.db:
+            cursor = self.db.execute('INSERT INTO sessions (name, part_id, procedure, started, updated, state) '
+                                     'VALUES (?, ?, ?, ?, ?, ?)', (name, part_id, procedure, started, started, state))
+        return cursor.lastrowid
+
+    def last_session(self, name: str, procedure: str) -> Optional[sqlite3.Row]:
+        return self.db.execute('SELECT * FROM sessions WHERE name = ? AND procedure = ? '
+                               'ORDER BY started DESC LIMIT 1', (name, procedure)).fetchone()
+
+    def can_resume(self, name: str, procedure: str) -> bool:
+        """
+        True if last session of participant is not complete (or there is none, e.g. it crashed before registry
+        existed), complete session is never resumed.
+        """
+        session = self.last_session(name, procedure)
+        return session is None or session['state'] != COMPLETE
+
+    def resume_session(self, name: str, part_id: str, procedure: str) -> int:
+        """
+        Mark last session of participant as running again, new session is registered if there is none.
+        :return: Session id.
+        :raises ValueError: Last session is complete.
+        """
+        if not self.can_resume(name, procedure):
+            raise ValueError(f'Last {procedure} session of {name} is complete, nothing to resume.')
+        session = self.last_session(name, procedure)
+        if session is None:
+            return self.start_session(name, part_id, procedure)
+        self.set_state(session['session_id'], RUNNING)
+        return session['session_id']
+
+    def set_state(self, session_id: int, state: str) -> None:
+        with self.db:
+            self.db.execute('UPDATE sessions SET state = ?, updated = ? WHERE session_id = ?',
+                            (state, time.time(), session_id))
+
+    def incomplete(self, procedure: str = None) -> List[sqlite3.Row]:
+        """
+        Sessions not completed (running, i.e. crashed or in progress, and aborted), oldest first.
+        """
+        query = 'SELECT * FROM sessions WHERE state != ?'
+        params = [COMPLETE]
+        if procedure is not None:
+            query += ' AND procedure = ?'
+            params.append(procedure)
+        return self.db.execute(query + ' ORDER BY started', params).fetchall()
+
+    def backfill(self, res_dir: str) -> int:
+        """
+        Register sessions from results dir: every beh file as complete session. Config copy or journal
+        without beh file (session crashed before beh was saved) as running one.
+        :return: No of sessions registered.
+        """
+        procedure = os.path.basename(os.path.normpath(res_dir)).replace('_results', '')
+        registered = set()
+        beh_dir = join(res_dir, 'beh')
+        for fname in sorted(os.listdir(beh_dir)) if os.path.isdir(beh_dir) else []:
+            match = BEH_FILE.match(fname)
+            if not match:
+                continue
+            part_id = match.group(1)
+            started = calendar.timegm(time.strptime(match.group(2), '%Y-%m-%d_%H_%M_%S'))  # names use UTC
+            self.start_session(part_id.split('_')[0], part_id, procedure, state=COMPLETE, started=started)
+            registered.add(part_id)
+        for sub_dir, suffixes in [('conf', [f'_{procedure}_config.yaml', '_config.yaml']), ('journal', ['.jsonl'])]:
+            sub_dir = join(res_dir, sub_dir)
+            for fname in sorted(os.listdir(sub_dir)) if os.path.isdir(sub_dir) else []:
+                suffix = next((suffix for suffix in suffixes if fname.endswith(suffix)), None)
+                part_id = fname[:-len(suffix)] if suffix else None
+                if part_id is not None and part_id not in registered:
+                    started = os.path.getmtime(join(sub_dir, fname))
+                    self.start_session(part_id.split('_')[0], part_id, procedure, state=RUNNING, started=started)
+                    registered.add(part_id)
+        return len(registered)
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Participant registry queries.')
+    parser.add_argument('--registry', default='participants.sqlite')
+    parser.add_argument('--procedure', default=None, help='cmp_dur, cmp_freq or cmp_vol, all by default.')
+    parser.add_argument('--incomplete', action='store_true', help='Show only not completed sessions.')
+    args = parser.parse_args()
+
+    registry = ParticipantRegistry(args.registry)
+    if args.incomplete:
+        sessions = registry.incomplete(args.procedure)
+    else:
+        query, params = 'SELECT * FROM sessions', []
+        if args.procedure is not None:
+            query, params = query + ' WHERE procedure = ?', [args.procedure]
+        sessions = registry.db.execute(query + ' ORDER BY started', params).fetchall()
+    for session in sessions:
+        started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(session['started']))
+        print(f"{session['session_id']:>5}  {session['procedure']:<9} {session['part_id']:<30} {started}  "
+              f"{session['state']}")
+    registry.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import time
+from typing import List, Optional, Tuple
+
+from psychopy import core
+from psychopy.hardware import keyboard
+
+
+class ResponseCollector(object):
+    """
+    Keyboard responses collected without busy waiting.
+    Keys are read from psychopy Keyboard, with psychtoolbox backend they are queued and timestamped
+    by PTB KbQueue thread (hardware timestamps), so collector may sleep between polls and RT still
+    doesn't depend on poll time. With other backends RT resolution is limited by **poll_interval**.
+
+    Usage:
+
+    ```
+    responses = ResponseCollector(key_list=['left', 'right'])
+    win.callOnFlip(responses.reset_clock)  # RT zero
+    win.flip()
+    response = responses.wait(max_wait=2.0)
+    ```
+    """
+
+    def __init__(self, key_list: List[str], poll_interval: float = 0.002):
+        """
+        :param key_list: Keys treated as responses.
+        :param poll_interval: Sleep time between queue polls [in s].
+        """
+        self.key_list = key_list
+        self.poll_interval = poll_interval
+        self.kb = keyboard.Keyboard()
+        self._rt_shift = 0.0
+        # Keyboard uses psychtoolbox backend whenever it's installed (and ioHub isn't running)
+        self.hardware_timestamps = keyboard.havePTB
+
+    @property
+    def clock(self) -> core.Clock:
+        return self.kb.clock
+
+    @property
+    def rt_resolution(self) -> float:
+        """
+        Worst case RT measurement resolution [in s]: timestamp clock resolution with hardware timestamps,
+        poll interval otherwise.
+        """
+        samples = _clock_samples()
+        clock_res = min(b - a for a, b in zip(samples, samples[1:]) if b > a)
+        return clock_res if self.hardware_timestamps else max(clock_res, self.poll_interval)
+
+    def reset_clock(self) -> None:
+        """
+        Set RT zero, call with win.callOnFlip to sync with stimulus onset.
+        """
+        self.kb.clock.reset()
+        self._rt_shift = 0.0
+
+    def set_rt_zero(self, zero_time: float) -> None:
+        """
+        Set RT zero to given (also future) time in core clock, e.g. sample exact onset from audio clock.
+        """
+        self.kb.clock.reset()
+        self._rt_shift = zero_time - core.getTime()
+
+    def clear(self) -> None:
+        self.kb.clearEvents()
+
+    def wait(self, max_wait: float) -> Optional[Tuple[str, float]]:
+        """
+        Wait for first response, sleeping between polls.
+        :param max_wait: Max waiting time from now [in s].
+        :return: (key name, RT relative to last reset_clock/set_rt_zero) or None on timeout.
+        """
+        deadline = core.getTime() + max_wait
+        while True:
+            keys = self.kb.getKeys(keyList=self.key_list, waitRelease=False)
+            if keys:
+                return keys[0].name, keys[0].rt - self._rt_shift
+            remaining = deadline - core.getTime()
+            if remaining <= 0:
+                return None
+            time.sleep(min(self.poll_interval, remaining))
+
+
+def _clock_samples(n: int = 2000) -> List[float]:
+    return [core.getTime() for _ in range(n)]
@@ -0,0 +1,211 @@
+"""
+Content-addressed snapshot store of code and config that sessions ran with. Every file is stored once, as blob
+named by its sha256, and snapshot (set of files) is named by hash of its (path, blob) list. Session keeps only
+snapshot hash, so disk use doesn't grow with number of participants, and sessions which ran given code version
+are found with index query.
+
+Queries and maintenance:
+
+    python -m misc.snapshots                        # snapshots with no of sessions
+    python -m misc.snapshots --sessions <hash>      # sessions run with given snapshot
+    python -m misc.snapshots --restore <hash> out   # files of snapshot written to out dir
+    python -m misc.snapshots --import cmp_freq_results cmp_dur_results  # old source/ and conf/ copies
+"""
+import argparse
+import glob
+import hashlib
+import os
+import sqlite3
+import time
+from os.path import join
+from typing import Dict, List
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshot_files (
+    snapshot TEXT NOT NULL,
+    path TEXT NOT NULL,
+    blob TEXT NOT NULL,
+    PRIMARY KEY (snapshot, path)
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    snapshot TEXT PRIMARY KEY,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    part_id TEXT NOT NULL,
+    procedure TEXT NOT NULL,
+    session_id INTEGER,
+    started REAL NOT NULL,
+    snapshot TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_snapshot ON sessions (snapshot);
+CREATE INDEX IF NOT EXISTS sessions_part_id_procedure ON sessions (part_id, procedure);
+"""
+
+
+def session_files(ver: str) -> List[str]:
+    """
+    Files which define session of given procedure version: script, its config, Adaptives and misc packages
+    (synthesis, tone bank, stim pack, playback, trigger and response timing) and create_stims.py, which builds
+    stim pack used by session.
+    """
+    return ['main.py', f'{ver}_config.yaml', 'create_stims.py'] + sorted(glob.glob(join('Adaptives', '*.py'))) + \
+        sorted(glob.glob(join('misc', '*.py')))
+
+
+class SnapshotStore(object):
+    """
+    Usage:
+
+    ```
+    store = SnapshotStore('snapshots')
+    snapshot = store.snapshot(session_files('cmp_freq'))
+    store.record_session(PART_ID, 'cmp_freq', snapshot, session_id=SESSION_ID)
+    ```
+    """
+
+    def __init__(self, root: str = 'snapshots'):
+        """
+        :param root: Store dir, with blobs/ and index.sqlite, created if missing.
+        """
+        self.root = root
+        os.makedirs(join(root, 'blobs'), exist_ok=True)
+        self.db = sqlite3.connect(join(root, 'index.sqlite'))
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def blob_path(self, blob: str) -> str:
+        return join(self.root, 'blobs', blob[:2], blob)
+
+    def put(self, content: bytes) -> str:
+        """
+        Store content, nothing is written if blob already exists.
+        :return: Blob hash.
+        """
+        blob = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(blob)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.tmp', 'wb') as blob_file:
+                blob_file.write(content)
+            os.replace(path + '.tmp', path)
+        return blob
+
+    def snapshot(self, paths: List[str], names: List[str] = None) -> str:
+        """
+        Store files as one snapshot.
+        :param paths: Files to store.
+        :param names: Names of files in snapshot, paths (with '/' separators) by default.
+        :return: Snapshot hash.
+        """
+        names = [path.replace(os.sep, '/') for path in paths] if names is None else names
+        files = dict()
+        for name, path in zip(names, paths):
+            with open(path, 'rb') as src_file:
+                files[name] = self.put(src_file.read())
+        listing = ''.join(f'{name}\0{blob}\n' for name, blob in sorted(files.items()))
+        snapshot = hashlib.sha256(listing.encode('utf-8')).hexdigest()
+        with self.db:
+            cursor = self.db.execute('INSERT OR IGNORE INTO snapshots (snapshot, created) VALUES (?, ?)',
+                                     (snapshot, time.time()))
+            if cursor.rowcount:
+                self.db.executemany('INSERT INTO snapshot_files (snapshot, path, blob) VALUES (?, ?, ?)',
+                                    [(snapshot, name, blob) for name, blob in files.items()])
+        return snapshot
+
+    def record_session(self, part_id: str, procedure: str, snapshot: str, session_id: int = None,
+                       started: float = None) -> None:
+        started = time.time() if started is None else started
+        with self.db:
+            self.db.execute('INSERT INTO sessions (part_id, procedure, session_id, started, snapshot) '
+                            'VALUES (?, ?, ?, ?, ?)', (part_id, procedure, session_id, started, snapshot))
+
+    def files(self, snapshot: str) -> Dict[str, str]:
+        """
+        :return: Dict file name -> blob hash.
+        """
+        rows = self.db.execute('SELECT path, blob FROM snapshot_files WHERE snapshot = ?', (snapshot,))
+        return {row['path']: row['blob'] for row in rows}
+
+    def read(self, snapshot: str, name: str) -> bytes:
+        with open(self.blob_path(self.files(snapshot)[name]), 'rb') as blob_file:
+            return blob_file.read()
+
+    def sessions(self, snapshot: str) -> List[sqlite3.Row]:
+        return self.db.execute('SELECT * FROM sessions WHERE snapshot = ? ORDER BY started', (snapshot,)).fetchall()
+
+    def restore(self, snapshot: str, out_dir: str) -> int:
+        """
+        Write files of snapshot into out_dir.
+        :return: No of files written.
+        """
+        files = self.files(snapshot)
+        for name, blob in files.items():
+            path = join(out_dir, *name.split('/'))
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(self.blob_path(blob), 'rb') as blob_file, open(path, 'wb') as out_file:
+                out_file.write(blob_file.read())
+        return len(files)
+
+    def import_results(self, res_dir: str) -> int:
+        """
+        Import source/<PART_ID>_main.py copies (with conf/ copy of this same session if there is one) made
+        before store existed, one snapshot per session. Copies are only read, they stay in results dir.
+        :return: No of sessions imported.
+        """
+        procedure = os.path.basename(os.path.normpath(res_dir)).replace('_results', '')
+        source_dir = join(res_dir, 'source')
+        imported = 0
+        for fname in sorted(os.listdir(source_dir)) if os.path.isdir(source_dir) else []:
+            if not fname.endswith('_main.py'):
+                continue
+            part_id = fname[:-len('_main.py')]
+            paths, names = [join(source_dir, fname)], ['main.py']
+            for conf_name in [f'{part_id}_{procedure}_config.yaml', f'{part_id}_config.yaml']:
+                if os.path.exists(join(res_dir, 'conf', conf_name)):
+                    paths.append(join(res_dir, 'conf', conf_name))
+                    names.append(f'{procedure}_config.yaml')
+                    break
+            already = self.db.execute('SELECT 1 FROM sessions WHERE part_id = ? AND procedure = ? LIMIT 1',
+                                      (part_id, procedure)).fetchone()
+            if already is None:
+                snapshot = self.snapshot(paths, names)
+                self.record_session(part_id, procedure, snapshot, started=os.path.getmtime(paths[0]))
+                imported += 1
+        return imported
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Snapshot store queries.')
+    parser.add_argument('--store', default='snapshots')
+    parser.add_argument('--sessions', metavar='SNAPSHOT', default=None, help='Sessions run with given snapshot.')
+    parser.add_argument('--restore', nargs=2, metavar=('SNAPSHOT', 'OUT_DIR'), default=None)
+    parser.add_argument('--import', dest='res_dirs', nargs='+', default=None,
+                        help='Import source and config copies from results dirs.')
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.store)
+    if args.res_dirs:
+        for res_dir in args.res_dirs:
+            print(f'{res_dir}: {store.import_results(res_dir)} sessions imported')
+    elif args.restore:
+        print(f'{store.restore(*args.restore)} files -> {args.restore[1]}')
+    elif args.sessions:
+        for session in store.sessions(args.sessions):
+            started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(session['started']))
+            print(f"{session['procedure']:<9} {session['part_id']:<30} {started}")
+    else:
+        rows = store.db.execute('SELECT snapshots.snapshot, created, COUNT(sessions.snapshot) AS n_sessions '
+                                'FROM snapshots LEFT JOIN sessions USING (snapshot) '
+                                'GROUP BY snapshots.snapshot ORDER BY created')
+        for row in rows:
+            created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row['created']))
+            print(f"{row['snapshot']}  {created}  {row['n_sessions']:>4} sessions")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import hashlib
+import os
+from typing import Dict, List
+
+import numpy as np
+
+from misc.tone_bank import ToneKey, tone_key
+
+MAGIC = b'SFSTPK02'  # 02: ramp shape in header
+ALIGN = 64  # payloads starts at multiples of ALIGN bytes
+INDEX_DTYPE = np.dtype([('freq', '<f8'), ('duration', '<f8'), ('rate', '<u4'), ('ramp', '<f8'),
+                        ('offset', '<u8'), ('n_samples', '<u8'), ('digest', 'S20')])
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('count', '<u8'), ('ramp_shape', 'S16')])
+
+
+def payload_digest(audio: np.ndarray) -> bytes:
+    """
+    SHA-1 of tone samples, stored in index to detect stale or damaged entries.
+    """
+    return hashlib.sha1(np.ascontiguousarray(audio, dtype='<i2').tobytes()).digest()
+
+
+class StimPack(object):
+    """
+    Single file stimulus pack: header, index of (freq, duration, rate, ramp) entries and raw int16 payloads.
+    File is memory-mapped, so get() returns zero-copy read only view, no file opening nor decoding during trial.
+    All tones of pack have this same ramp shape (linear, cosine or hann), kept in header.
+
+    Layout (little endian):
+        magic 'SFSTPK02', uint64 count, 16 bytes ramp shape,
+        count * INDEX_DTYPE records,
+        int16 payloads, each aligned to ALIGN bytes.
+    """
+
+    def __init__(self, path: str, ramp_shape: str = None):
+        """
+        :param path: Pack file, created with StimPack.write.
+        :param ramp_shape: Expected ramp shape of tones, ValueError is raised if pack was built with other one.
+                           Not checked if None.
+        """
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode='r')
+        header = np.frombuffer(self._data, dtype=HEADER_DTYPE, count=1)[0]
+        if header['magic'] != MAGIC:
+            raise ValueError(f'{path} is not a stimulus pack (or was built by older version, rebuild it).')
+        self.ramp_shape = header['ramp_shape'].decode('ascii')
+        if ramp_shape is not None and ramp_shape != self.ramp_shape:
+            raise ValueError(f'{path} tones have {self.ramp_shape} ramp, not {ramp_shape}.')
+        self.index = np.frombuffer(self._data, dtype=INDEX_DTYPE, count=int(header['count']),
+                                   offset=HEADER_DTYPE.itemsize)
+        self._entries = {tone_key(e['freq'], e['duration'], e['rate'], e['ramp']): e for e in self.index}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: ToneKey):
+        return key in self._entries
+
+    def keys(self) -> List[ToneKey]:
+        return list(self._entries)
+
+    def digest(self, freq: float, duration: float, rate: int, ramp: float) -> bytes:
+        return bytes(self._entries[tone_key(freq, duration, rate, ramp)]['digest'])
+
+    def get(self, freq: float, duration: float, rate: int, ramp: float) -> np.ndarray:
+        """
+        :return: Read only int16 view of tone, KeyError if tone is not in pack.
+        """
+        entry = self._entries[tone_key(freq, duration, rate, ramp)]
+        offset, n_samples = int(entry['offset']), int(entry['n_samples'])
+        return self._data[offset:offset + 2 * n_samples].view('<i2')
+
+    @staticmethod
+    def write(path: str, tones: Dict[ToneKey, np.ndarray], ramp_shape: str) -> None:
+        """
+        Write tones into new pack. File is replaced atomically, open packs still see old data.
+        :param path: Pack file.
+        :param tones: (freq, duration, rate, ramp) -> int16 samples, or -> (int16 samples, digest).
+        :param ramp_shape: Ramp shape all tones were synthesised with.
+        """
+        tones = {key: (val if isinstance(val, tuple) else (val, None)) for key, val in tones.items()}
+        index = np.zeros(len(tones), dtype=INDEX_DTYPE)
+        offset = _align(HEADER_DTYPE.itemsize + index.nbytes)
+        for entry, (key, (audio, digest)) in zip(index, tones.items()):
+            entry['freq'], entry['duration'], entry['rate'], entry['ramp'] = tone_key(*key)
+            entry['offset'], entry['n_samples'] = offset, len(audio)
+            entry['digest'] = payload_digest(audio) if digest is None else digest
+            offset = _align(offset + 2 * len(audio))
+        header = np.array([(MAGIC, len(tones), ramp_shape.encode('ascii'))], dtype=HEADER_DTYPE)
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as pack_file:
+            pack_file.write(header.tobytes())
+            pack_file.write(index.tobytes())
+            for entry, (audio, _) in zip(index, tones.values()):
+                pack_file.seek(int(entry['offset']))
+                pack_file.write(np.ascontiguousarray(audio, dtype='<i2').tobytes())
+            pack_file.truncate(offset)
+        os.replace(tmp_path, path)
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGN) * ALIGN
@@ -0,0 +1,222 @@
+import threading
+import wave
+from functools import lru_cache
+from typing import Iterator
+
+import numpy as np
+
+RAMPS = ('linear', 'cosine', 'hann')
+
+
+@lru_cache(maxsize=32)
+def ramp_envelope(n_samples: int, ramp: str = 'linear') -> np.ndarray:
+    """
+    Rising part of tone envelope, falling part is the same array reversed.
+    :param n_samples: Ramp length.
+    :param ramp: One of RAMPS. Linear, raised cosine (half cosine period) or Hann (first half of Hann window).
+    :return: Read only float32 array with values from 0 to 1.
+    """
+    if ramp == 'linear':
+        env = np.linspace(0, 1, n_samples)
+    elif ramp == 'cosine':
+        env = 0.5 - 0.5 * np.cos(np.pi * np.linspace(0, 1, n_samples))
+    elif ramp == 'hann':
+        env = np.hanning(2 * n_samples)[:n_samples]
+    else:
+        raise ValueError(f'Unknown ramp: {ramp}. Use one of {RAMPS}.')
+    env = env.astype(np.float32)
+    env.flags.writeable = False
+    return env
+
+
+class ToneSynth(object):
+    """
+    Sine tones synthesis with preallocated work buffers.
+    Buffers grows to the longest tone ever rendered and are reused later, so single tone costs
+    only one allocation - returned int16 array (or none, if **out** is given).
+    Instance is not thread safe, use one per thread.
+    """
+
+    def __init__(self):
+        self._index = np.empty(0, dtype=np.float64)
+        self._phase = np.empty(0, dtype=np.float64)
+        self._signal = np.empty(0, dtype=np.float32)
+
+    def _buffers(self, n_samples: int):
+        if n_samples > len(self._signal):
+            self._index = np.arange(n_samples, dtype=np.float64)
+            self._phase = np.empty(n_samples, dtype=np.float64)
+            self._signal = np.empty(n_samples, dtype=np.float32)
+        return self._phase[:n_samples], self._signal[:n_samples]
+
+    def render(self, freq: float, sound_time: float, sample_rate: int = 44100, transition_time: float = 0.05,
+               ramp: str = 'linear', wsf: int = 32767, normalize: bool = True, out: np.ndarray = None) -> np.ndarray:
+        """
+        :param freq: Sine wave frequency [in Hz].
+        :param sound_time: Tone duration [in s].
+        :param sample_rate: Samples per second.
+        :param transition_time: Rise up and fall down time [in s], 0 means no ramp.
+        :param ramp: Ramp shape, one of RAMPS.
+        :param wsf: WAVE Scaling factor, peak amplitude of int16 output.
+        :param normalize: Scale peak of enveloped tone to exactly **wsf**.
+        :param out: Optional int16 array for result, must be at least int(sound_time * sample_rate) long.
+        :return: int16 tone.
+        """
+        n_samples = int(sound_time * sample_rate)
+        phase, signal = self._buffers(n_samples)
+        # phase is kept in float64, float32 losses precision after few seconds of tone
+        np.multiply(self._index[:n_samples], 2 * np.pi * freq / sample_rate, out=phase)
+        np.sin(phase, out=signal)
+        apply_ramp(signal, int(transition_time * sample_rate), ramp)
+        if out is None:
+            out = np.empty(n_samples, dtype=np.int16)
+        return quantize(signal, wsf=wsf, normalize=normalize, out=out[:n_samples])
+
+
+def apply_ramp(signal: np.ndarray, n_ramp: int, ramp: str = 'linear') -> np.ndarray:
+    """
+    In place rise up and fall down of signal, to avoid clicks.
+    """
+    n_ramp = min(n_ramp, len(signal) // 2)
+    if n_ramp:
+        env = ramp_envelope(n_ramp, ramp)
+        signal[:n_ramp] *= env
+        signal[len(signal) - n_ramp:] *= env[::-1]
+    return signal
+
+
+def quantize(signal: np.ndarray, wsf: int = 32767, normalize: bool = True, out: np.ndarray = None) -> np.ndarray:
+    """
+    Convert float signal to int16, values are scaled in place, so **signal** is modified.
+    Empty signal (zero length tone) gives empty array.
+    """
+    if normalize:
+        peak = max(signal.max(), -signal.min()) if len(signal) else 0
+        if peak > 0:
+            signal *= wsf / peak
+    else:
+        signal *= wsf
+    np.clip(signal, -32768, 32767, out=signal)
+    if out is None:
+        out = np.empty(len(signal), dtype=np.int16)
+    np.copyto(out, signal, casting='unsafe')
+    return out
+
+
+_LOCAL = threading.local()
+
+
+def sine_tone(freq: float, sound_time: float, sample_rate: int = 44100, transition_time: float = 0.05,
+              ramp: str = 'linear', wsf: int = 32767, normalize: bool = True) -> np.ndarray:
+    """
+    Module level shortcut for ToneSynth.render, every thread has its own synth (and buffers).
+    """
+    if not hasattr(_LOCAL, 'synth'):
+        _LOCAL.synth = ToneSynth()
+    return _LOCAL.synth.render(freq, sound_time, sample_rate=sample_rate, transition_time=transition_time,
+                               ramp=ramp, wsf=wsf, normalize=normalize)
+
+
+def tone_blocks(freq: float, sound_time: float, sample_rate: int = 44100, transition_time: float = 0.05,
+                ramp: str = 'linear', wsf: int = 32767, block_size: int = 1024) -> Iterator[np.ndarray]:
+    """
+    Streaming version of ToneSynth.render, tone is generated block by block from phase accumulator,
+    so memory usage doesn't depend on tone duration and playback can start after first block.
+    Peak is not known in advance, so tone is scaled by **wsf** instead of normalized (same for pure sine).
+    :param block_size: No of samples in each block, last one can be shorter.
+    :return: Generator of int16 blocks. The same buffer is reused, consume (or copy) block before next one.
+    """
+    n_samples = int(sound_time * sample_rate)
+    n_ramp = min(int(transition_time * sample_rate), n_samples // 2)
+    env = ramp_envelope(n_ramp, ramp) if n_ramp else None
+    step = 2 * np.pi * freq / sample_rate
+    index = np.arange(block_size, dtype=np.float64)
+    phase_buf = np.empty(block_size, dtype=np.float64)
+    signal_buf = np.empty(block_size, dtype=np.float32)
+    out_buf = np.empty(block_size, dtype=np.int16)
+    phase = 0.0
+    for start in range(0, n_samples, block_size):
+        size = min(block_size, n_samples - start)
+        block_phase, signal = phase_buf[:size], signal_buf[:size]
+        np.multiply(index[:size], step, out=block_phase)
+        block_phase += phase
+        np.sin(block_phase, out=signal)
+        phase = (phase + size * step) % (2 * np.pi)
+        if env is not None:
+            _ramp_block(signal, start, n_samples, env)
+        yield quantize(signal, wsf=wsf, normalize=False, out=out_buf[:size])
+
+
+def _ramp_block(signal: np.ndarray, start: int, n_samples: int, env: np.ndarray) -> None:
+    # parts of block overlapping rise up ([0, n_ramp)) or fall down ([n_samples - n_ramp, n_samples)) ranges
+    n_ramp, stop = len(env), start + len(signal)
+    if start < n_ramp:
+        signal[:n_ramp - start] *= env[start:min(stop, n_ramp)]
+    fall_start = n_samples - n_ramp
+    if stop > fall_start:
+        first = max(start, fall_start)
+        signal[first - start:] *= env[::-1][first - fall_start:stop - fall_start]
+
+
+def wave_blocks(path: str, block_size: int = 1024) -> Iterator[np.ndarray]:
+    """
+    Stream int16 PCM WAVE file (white noise maskers etc.) in blocks without loading whole file.
+    :return: Generator of int16 blocks, interleaved if file has more than one channel.
+    """
+    with wave.open(path, 'rb') as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f'Only 16-bit PCM WAVE files can be streamed, {path} is not.')
+        frames = wav.readframes(block_size)
+        while frames:
+            yield np.frombuffer(frames, dtype=np.int16)
+            frames = wav.readframes(block_size)
+
+
+if __name__ == '__main__':
+    # Micro benchmark: time, allocations and peak traced memory per tone, old list based ramp vs ToneSynth.
+    # Allocations are NumPy data buffers still alive after render (diff of tracemalloc snapshots, results are
+    # kept), temporaries freed inside render are not counted, their cost shows up in peak memory.
+    import timeit
+    import tracemalloc
+
+    def list_ramp_tone(freq, sound_time, sample_rate=44100, transition_time=0.05):
+        t = np.linspace(0, sound_time, int(sound_time * sample_rate), False)
+        note = np.sin(freq * t * 2 * np.pi)
+        transition_samples = int(transition_time * sample_rate)
+        fall_down = np.linspace(1, 0, transition_samples)
+        rise_up = np.linspace(0, 1, transition_samples)
+        pass_throught = [1] * (len(note) - (2 * transition_samples))
+        transition = np.hstack((rise_up, pass_throught, fall_down))
+        audio = note * transition
+        audio *= 32767 / np.max(np.abs(audio))
+        return audio.astype(np.int16)
+
+    def allocations(func, n_tones):
+        tones = list()
+        tones.append(func(440, sound_time))  # warm up buffers, list storage
+        before = tracemalloc.take_snapshot()
+        for _ in range(n_tones):
+            tones.append(func(440, sound_time))
+        after = tracemalloc.take_snapshot()
+        numpy_data = [tracemalloc.DomainFilter(True, np.lib.tracemalloc_domain)]
+        diff = after.filter_traces(numpy_data).compare_to(before.filter_traces(numpy_data), 'traceback')
+        return sum(stat.count_diff for stat in diff) / n_tones
+
+    synth = ToneSynth()
+    out = np.empty(10 * 44100, dtype=np.int16)
+    candidates = {'list ramp': list_ramp_tone,
+                  'ToneSynth': synth.render,
+                  'ToneSynth, out': lambda *args: synth.render(*args, out=out)}
+    for sound_time in [0.5, 0.8, 3.0]:
+        tone_bytes = int(sound_time * 44100) * 2
+        for name, func in candidates.items():
+            func(440, sound_time)  # warm up buffers
+            tracemalloc.start()
+            func(440, sound_time)
+            _, peak = tracemalloc.get_traced_memory()
+            n_allocs = allocations(func, n_tones=10)
+            tracemalloc.stop()
+            n_runs = 50
+            dt = timeit.timeit(lambda: func(440, sound_time), number=n_runs) / n_runs
+            print(f'{sound_time:4.1f}s {name:15s} {dt * 1e3:7.3f} ms/tone, {n_allocs:4.1f} allocs/tone, '
+                  f'peak memory {peak / 1024:9.1f} KiB = {peak / tone_bytes:5.1f} x int16 tone size')
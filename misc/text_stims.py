@@ -0,0 +1,67 @@
+from typing import Callable, Iterable
+
+from psychopy import visual, logging
+
+
+def N_(msgid: str) -> str:
+    """
+    Marks literal msgid for extraction (pygettext/xgettext with -k N_) without translating it,
+    translation is done by TextStimRegistry when label is built.
+    """
+    return msgid
+
+
+class TextStimRegistry(object):
+    """
+    Session wide pool of prebuilt TextStim objects, keyed by label id (gettext msgid) and language.
+    All labels are created (and laid out) once, before first trial, so drawing them during trial
+    doesn't allocate any GL objects.
+
+    Usage:
+
+    ```
+    labels = TextStimRegistry(win, lang='pl_PL', translate=_, font='Arial', height=20)
+    labels.register([N_('Corr ans'), N_('Incorr ans')])
+    labels.get('Corr ans').draw()
+    ```
+    """
+
+    def __init__(self, win: visual.Window, lang: str, translate: Callable[[str], str] = str, **defaults):
+        """
+        :param win: Window for all stimuli.
+        :param lang: Language of labels, part of the key.
+        :param translate: Func mapping label id to text on screen, gettext usually.
+        :param defaults: TextStim params used when not given explicitly in register/get.
+        """
+        self.win = win
+        self.lang = lang
+        self.translate = translate
+        self.defaults = defaults
+        self._stims = dict()
+
+    def __contains__(self, label_id: str):
+        return (label_id, self.lang) in self._stims
+
+    def __len__(self):
+        return len(self._stims)
+
+    def register(self, label_ids: Iterable[str], **params) -> None:
+        """
+        Build stimuli for all given labels, already registered ones are left untouched.
+        :param label_ids: gettext msgids.
+        :param params: TextStim params, override defaults.
+        """
+        for label_id in label_ids:
+            if label_id not in self:
+                self._stims[(label_id, self.lang)] = visual.TextStim(self.win, text=self.translate(label_id),
+                                                                     **{**self.defaults, **params})
+
+    def get(self, label_id: str, **params) -> visual.TextStim:
+        """
+        Prebuilt stimulus for label. Not registered label is created (and logged), so it's still shown,
+        but registry should be filled in advance. Params are used only in that case.
+        """
+        if label_id not in self:
+            logging.warning(f'Label "{label_id}" not registered before use, created on demand.')
+            self.register([label_id], **params)
+        return self._stims[(label_id, self.lang)]
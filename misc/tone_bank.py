@@ -0,0 +1,133 @@
+import threading
+from collections import OrderedDict
+from math import gcd
+from typing import Callable, Iterable, List, Tuple
+
+import numpy as np
+
+ToneKey = Tuple[float, float, int, float]
+
+
+def tone_key(freq: float, sound_time: float, sample_rate: int, transition_time: float) -> ToneKey:
+    """
+    Normalised tone key, floats are rounded so (TIME + soa) / 1000. always gives this same key.
+    """
+    return round(float(freq), 6), round(float(sound_time), 6), int(sample_rate), round(float(transition_time), 6)
+
+
+def staircase_levels(start_val: int, step_up: int, step_down: int, max_levels: int) -> List[int]:
+    """
+    All levels adaptive procedure can reach, ordered by distance from start value (closest first).
+    NUpNDown moves by -step_up or +step_down and clamps to 0, so reachable values lay on grid
+    with gcd(step_up, step_down) spacing, started from start_val or from 0 (after clamping).
+    :param start_val: Initial value of adaptive procedure.
+    :param step_up: Value of dec after n_up correct answers.
+    :param step_down: Value of inc after n_down incorrect answers.
+    :param max_levels: How many levels should be returned.
+    :return: List of non negative levels.
+    """
+    step = gcd(step_up, step_down)
+    levels = set()
+    for k in range(max_levels):
+        levels.update([start_val + k * step, start_val - k * step, k * step])
+    levels = sorted((lvl for lvl in levels if lvl >= 0), key=lambda lvl: (abs(lvl - start_val), lvl))
+    return levels[:max_levels]
+
+
+class ToneBank(object):
+    """
+    Bounded LRU cache of ready to play int16 tones.
+    Tones are identified by (freq, duration, sample rate, ramp) and synthesised only once,
+    all later requests are served from memory. If StimPack is given, tones found in it are
+    served as zero-copy views of the pack file instead of being synthesised.
+    Bank can be shared between threads (e.g. with Prefetcher), tones are synthesised outside of lock.
+
+    Usage:
+
+    ```
+    bank = ToneBank(synth=prepare_sound, max_size=256)
+    bank.warm_up(keys)
+    audio = bank.get(freq=440, sound_time=0.5)
+    ```
+    """
+
+    def __init__(self, synth: Callable[..., np.ndarray], max_size: int = 256, sample_rate: int = 44100,
+                 transition_time: float = 0.05, pack=None):
+        """
+        :param synth: Func with prepare_sound signature, used when tone is not in bank yet.
+        :param max_size: Max no of tones kept in memory, least recently used are dropped first.
+        :param sample_rate: Default sample rate for get.
+        :param transition_time: Default ramp (rise up and fall down) time for get [in s].
+        :param pack: Optional StimPack with precomputed tones.
+        """
+        assert max_size > 0, 'Illegal bank size'
+        self.synth = synth
+        self.max_size = max_size
+        self.sample_rate = sample_rate
+        self.transition_time = transition_time
+        self.pack = pack
+        self.hits = 0
+        self.misses = 0
+        self._tones = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tones)
+
+    def __contains__(self, key: ToneKey):
+        return key in self._tones
+
+    def key(self, freq: float, sound_time: float, sample_rate: int = None, transition_time: float = None) -> ToneKey:
+        """
+        Cache key, sample rate and ramp defaults to bank ones.
+        """
+        sample_rate = self.sample_rate if sample_rate is None else sample_rate
+        transition_time = self.transition_time if transition_time is None else transition_time
+        return tone_key(freq, sound_time, sample_rate, transition_time)
+
+    def get(self, freq: float, sound_time: float, sample_rate: int = None, transition_time: float = None) -> np.ndarray:
+        """
+        Get tone from bank, synthesise it on miss.
+        Returned array is read only, it's shared between all trials.
+        """
+        key = self.key(freq, sound_time, sample_rate, transition_time)
+        with self._lock:
+            audio = self._tones.get(key)
+            if audio is not None:
+                self.hits += 1
+                self._tones.move_to_end(key)
+                return audio
+            self.misses += 1
+        return self._put(key)
+
+    def warm_up(self, keys: Iterable[ToneKey]) -> int:
+        """
+        Synthesise all missing tones, tones already in bank are marked as recently used.
+        :param keys: (freq, duration, sample rate, ramp) tuples.
+        :return: No of synthesised tones.
+        """
+        created = 0
+        for freq, sound_time, sample_rate, transition_time in keys:
+            key = self.key(freq, sound_time, sample_rate, transition_time)
+            with self._lock:
+                present = key in self._tones
+                if present:
+                    self._tones.move_to_end(key)
+            if not present:
+                self._put(key)
+                created += 1
+        return created
+
+    def _put(self, key: ToneKey) -> np.ndarray:
+        freq, sound_time, sample_rate, transition_time = key
+        if self.pack is not None and key in self.pack:
+            audio = self.pack.get(*key)
+        else:
+            audio = self.synth(freq=freq, sound_time=sound_time, sample_rate=sample_rate,
+                               transition_time=transition_time)
+        audio.flags.writeable = False
+        with self._lock:
+            self._tones[key] = audio
+            if len(self._tones) > self.max_size:
+                self._tones.popitem(last=False)
+        return audio
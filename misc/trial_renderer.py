@@ -0,0 +1,61 @@
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+Segment = Union[Tuple[str, np.ndarray], float]
+
+
+class TrialRenderer(object):
+    """
+    Renders whole trial timeline (e.g. noise, gap, tone 1, gap, tone 2) into one int16 buffer,
+    so trial is played in one call and every boundary is sample exact.
+    Two preallocated buffers are used in turns, so next trial can be rendered while previous one still plays.
+
+    Usage:
+
+    ```
+    renderer = TrialRenderer(sample_rate=44100)
+    audio, onsets = renderer.render([('noise', noise), 1.2, ('stim_1', tone_1), 0.6, ('stim_2', tone_2)])
+    onsets['stim_2_start']  # sample offset of second tone
+    ```
+    """
+
+    def __init__(self, sample_rate: int = 44100, max_time: float = 10.0):
+        """
+        :param sample_rate: Sample rate of all segments.
+        :param max_time: Initial buffers length [in s], they grow when longer trial is rendered.
+        """
+        self.sample_rate = sample_rate
+        self._buffers = [np.zeros(int(max_time * sample_rate), dtype=np.int16) for _ in range(2)]
+        self._curr = 0
+
+    def render(self, timeline: List[Segment]) -> Tuple[np.ndarray, Dict[str, int]]:
+        """
+        :param timeline: Named sounds, as (name, int16 samples) pairs, and silent gaps, as floats [in s].
+        :return: Rendered trial (view of internal buffer, valid until next but one render) and onsets table:
+                 '<name>_start' and '<name>_end' sample offsets for every sound.
+        """
+        segments = [(None, int(round(seg * self.sample_rate))) if isinstance(seg, (int, float)) else seg
+                    for seg in timeline]
+        n_samples = sum(seg if name is None else len(seg) for name, seg in segments)
+        self._curr = 1 - self._curr
+        if n_samples > len(self._buffers[self._curr]):
+            self._buffers[self._curr] = np.zeros(n_samples, dtype=np.int16)
+        audio = self._buffers[self._curr][:n_samples]
+        onsets = dict()
+        pos = 0
+        for name, seg in segments:
+            if name is None:
+                audio[pos:pos + seg] = 0
+                pos += seg
+            else:
+                audio[pos:pos + len(seg)] = seg
+                onsets[f'{name}_start'], onsets[f'{name}_end'] = pos, pos + len(seg)
+                pos += len(seg)
+        return audio, onsets
+
+    def onset_times(self, onsets: Dict[str, int], start_time: float) -> Dict[str, float]:
+        """
+        Convert sample offsets into times, given time of first sample (e.g. Voice.start_time).
+        """
+        return {name: start_time + offset / self.sample_rate for name, offset in onsets.items()}
@@ -0,0 +1,111 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class TriggerScheduler(object):
+    """
+    Sends EEG triggers at times taken from audio clock.
+    Triggers are registered as AudioEngine markers (sample offsets in played buffer). Audio callback knows
+    exactly when marked sample reaches DAC and passes that time here. Trigger itself is sent from dedicated
+    thread, which sleeps and then spins to that time, because sending (port write and hold) may take longer
+    than one audio block and can't be done in callback. All triggers, also not audio bound ones (send_now),
+    go through this one thread, so they are never sent concurrently and keep their order.
+
+    Usage:
+
+    ```
+    scheduler = TriggerScheduler(send=TRIGGERS.send_trigger, clock=core.getTime)
+    engine.play(audio, markers=[(onset, scheduler.marker('stim_1_start'))])
+    scheduler.send_now('answered')
+    scheduler.flush()
+    scheduler.latency_stats()
+    ```
+    """
+
+    def __init__(self, send: Callable[[str], Optional[int]], clock: Callable[[], float] = time.perf_counter,
+                 spin_time: float = 0.002, trigger_limit: int = 60):
+        """
+        :param send: Func sending trigger of given type, TriggerHandler.send_trigger usually. If it returns int,
+                     it's taken as value sent to EEG.
+        :param clock: The same clock as used by AudioEngine.
+        :param spin_time: Last part of waiting [in s] done by spinning instead of sleep, for precision.
+        :param trigger_limit: Values sent to EEG are cycled 1..trigger_limit, like in TriggerHandler. All triggers
+                              of session go through scheduler, so its count of sent triggers gives value of each
+                              one (used when **send** doesn't return it).
+        """
+        self.send = send
+        self.clock = clock
+        self.spin_time = spin_time
+        self.trigger_limit = trigger_limit
+        self.latencies: List[float] = list()  # send time - target time, for audio bound triggers
+        self.n_sent = 0
+        self._sent: List[Tuple[str, int, float]] = list()
+        self._triggers = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='trigger-scheduler', daemon=True)
+        self._thread.start()
+
+    def marker(self, trigger_type: str) -> Callable[[float], None]:
+        """
+        Func for AudioEngine.play markers, sends trigger when marked sample is played.
+        """
+        return lambda dac_time: self._triggers.put((trigger_type, dac_time))
+
+    def send_now(self, trigger_type: str) -> None:
+        """
+        Send trigger as soon as possible, after all already scheduled ones.
+        """
+        self._triggers.put((trigger_type, None))
+
+    def flush(self) -> None:
+        """
+        Block until all queued triggers are sent, e.g. before adding info to last trigger.
+        """
+        self._triggers.join()
+
+    def pop_sent(self) -> List[Tuple[str, int, float]]:
+        """
+        (trigger type, value sent to EEG, send time) of triggers sent since last call, call it after flush().
+        """
+        sent, self._sent = self._sent, list()
+        return sent
+
+    def close(self) -> None:
+        self._triggers.put(None)
+        self._thread.join()
+
+    def latency_stats(self) -> Dict[str, Optional[float]]:
+        """
+        Trigger to sound latency of audio bound triggers [in s].
+        """
+        if not self.latencies:
+            return dict(n=0, mean=None, std=None, min=None, max=None)
+        lat = np.array(self.latencies)
+        return dict(n=len(lat), mean=lat.mean(), std=lat.std(), min=lat.min(), max=lat.max())
+
+    def _run(self) -> None:
+        while True:
+            item = self._triggers.get()
+            try:
+                if item is None:
+                    return
+                trigger_type, target_time = item
+                if target_time is not None:
+                    remaining = target_time - self.clock()
+                    if remaining > self.spin_time:
+                        time.sleep(remaining - self.spin_time)
+                    while self.clock() < target_time:
+                        pass
+                send_time = self.clock()
+                if target_time is not None:
+                    self.latencies.append(send_time - target_time)
+                value = self.send(trigger_type)
+                if not isinstance(value, int) or isinstance(value, bool):
+                    value = self.n_sent % self.trigger_limit + 1
+                self.n_sent += 1
+                self._sent.append((trigger_type, value, send_time))
+            finally:
+                self._triggers.task_done()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Parameter sweep of staircase settings on simulated observers.
+Every grid cell (combination of staircase params and observer threshold) is simulated with BatchNUpNDownMinIters,
+cells are sharded across process pool. Result is columnar table, one row per cell, saved as .npz
+(or .parquet, if pandas with pyarrow is installed).
+
+Example:
+    python sweep_staircase.py --config cmp_freq_config.yaml --set STEP_UP=1,2 --set MAX_REVS=10,12,14 \
+        --set TARGET_SE=0,0.5 --thresholds 3 5 8 --n-sims 20000 --out sweep_cmp_freq.npz
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+import yaml
+
+from Adaptives.BatchNUpNDownMinIters import BatchNUpNDownMinIters, PsychometricObserver
+
+PARAMS = ['N_UP', 'N_DOWN', 'START_SOA', 'STEP_UP', 'STEP_DOWN', 'MAX_REVS', 'MIN_TRIALS', 'MAX_TRIALS', 'TARGET_SE']
+
+
+def simulate_cell(cell: Dict[str, float], n_sims: int, slope: float, lapse_rate: float, seed: int) -> Dict[str, float]:
+    """
+    Worker func, simulate one grid cell.
+    :return: Cell params with expected session length, reversal count and threshold error.
+    """
+    sims = BatchNUpNDownMinIters(n_sims=n_sims, n_up=cell['N_UP'], n_down=cell['N_DOWN'], max_revs=cell['MAX_REVS'],
+                                 start_val=cell['START_SOA'], step_up=cell['STEP_UP'], step_down=cell['STEP_DOWN'],
+                                 min_iters=cell['MIN_TRIALS'], max_iters=cell['MAX_TRIALS'],
+                                 target_se=cell['TARGET_SE'] or None)
+    observer = PsychometricObserver(threshold=cell['THRESHOLD'], slope=slope, lapse_rate=lapse_rate, seed=seed)
+    res = sims.run(observer)
+    bias = res['bias'][~np.isnan(res['bias'])]
+    row = dict(cell)
+    row.update(trials_mean=res['n_trials'].mean(), trials_p95=np.percentile(res['n_trials'], 95),
+               revs_mean=res['revs'].mean(), convergence_rate=res['converged'].mean(),
+               estimated_rate=len(bias) / n_sims,
+               bias_mean=bias.mean() if len(bias) else np.nan, bias_sd=bias.std() if len(bias) else np.nan,
+               rmse=np.sqrt(np.mean(bias ** 2)) if len(bias) else np.nan,
+               true_threshold=float(res['true_threshold'][0]))
+    return row
+
+
+def grid_cells(base: Dict[str, float], overrides: Dict[str, List[float]], thresholds: List[float]) -> List[Dict]:
+    axes = {name: overrides.get(name, [base[name]]) for name in PARAMS}
+    axes['THRESHOLD'] = thresholds
+    return [dict(zip(axes, values)) for values in itertools.product(*axes.values())]
+
+
+def save_table(rows: List[Dict], path: str) -> None:
+    columns = {name: np.array([row[name] for row in rows]) for name in rows[0]}
+    if path.endswith('.parquet'):
+        import pandas as pd
+        pd.DataFrame(columns).to_parquet(path)
+    else:
+        np.savez(path, **columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Staircase parameters sweep on simulated observers.')
+    parser.add_argument('--config', default='cmp_freq_config.yaml', help='Procedure config with default params.')
+    parser.add_argument('--set', action='append', default=[], metavar='PARAM=V1,V2',
+                        help=f'Values of swept param, one of {PARAMS}. Can be used many times.')
+    parser.add_argument('--thresholds', nargs='+', type=float, required=True, help='Simulated observers thresholds.')
+    parser.add_argument('--slope', type=float, default=3.5, help='Observers Weibull slope.')
+    parser.add_argument('--lapse-rate', type=float, default=0.02)
+    parser.add_argument('--n-sims', type=int, default=10000, help='Simulated observers per cell.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size, no of CPUs by default.')
+    parser.add_argument('--out', default='sweep.npz', help='Results table, .npz or .parquet.')
+    args = parser.parse_args()
+
+    base = yaml.load(open(args.config, 'r'), Loader=yaml.SafeLoader)
+    overrides = dict()
+    for item in args.set:
+        name, values = item.split('=')
+        if name not in PARAMS:
+            parser.error(f'Unknown param {name}, use one of {PARAMS}.')
+        overrides[name] = [float(val) if name == 'TARGET_SE' else int(val) for val in values.split(',')]
+    cells = grid_cells(base, overrides, args.thresholds)
+
+    workers = args.workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rows = list(pool.map(simulate_cell, cells, [args.n_sims] * len(cells), [args.slope] * len(cells),
+                             [args.lapse_rate] * len(cells), [args.seed + idx for idx in range(len(cells))]))
+    save_table(rows, args.out)
+    print(f'{len(cells)} cells x {args.n_sims} observers, {time.perf_counter() - start:.1f} s -> {args.out}')
+
+
+if __name__ == '__main__':
+    main()
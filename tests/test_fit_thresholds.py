@@ -0,0 +1,35 @@
+import csv
+import math
+
+from fit_thresholds import fit_session
+
+HEADER = ['PART_ID', 'Trial', 'Proc_version', 'Exp', 'Key', 'Corr', 'SOA', 'Reversal', 'Level', 'Rev_count', 'Lat',
+          'Standard_first', 'Standard_higher', 'Track']
+
+
+def beh_file(tmp_path, rows, conf=None):
+    res_dir = tmp_path / 'cmp_freq_results'
+    (res_dir / 'beh').mkdir(parents=True)
+    path = res_dir / 'beh' / 'P1_MALE_20_2024-01-01_10_00_00_beh.csv'
+    with open(path, 'w') as beh:
+        csv.writer(beh).writerows([HEADER] + rows)
+    if conf is not None:
+        (res_dir / 'conf').mkdir()
+        (res_dir / 'conf' / 'P1_MALE_20_cmp_freq_config.yaml').write_text(conf)
+    return str(path)
+
+
+def test_header_only_session(tmp_path):
+    fits = fit_session(beh_file(tmp_path, [], conf='N_UP: 3\nN_DOWN: 1\n'), n_boot=10, discard_revs=0, seed=0)
+    assert len(fits) == 1
+    assert fits[0]['track'] == 'main' and fits[0]['n_trials'] == 0
+    assert math.isnan(fits[0]['rev_threshold']) and math.isnan(fits[0]['fit_threshold'])
+
+
+def test_session_without_conf(tmp_path):
+    rows = [['P1_MALE_20', idx, 'cmp_freq', 'exp', 'z', int(idx % 4 != 0), soa, int(idx % 4 == 0), 0, 0, 0.5, 1, 1,
+             'main'] for idx, soa in enumerate([10, 10, 9, 9, 10, 10, 9, 9], 1)]
+    fits = fit_session(beh_file(tmp_path, rows), n_boot=10, discard_revs=0, seed=0)
+    assert fits[0]['n_trials'] == 8 and fits[0]['n_revs'] == 2
+    assert fits[0]['rev_threshold'] == 9.0
+    assert fits[0]['target_p'] > 0.5
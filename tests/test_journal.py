@@ -0,0 +1,116 @@
+import csv
+import time
+
+import pytest
+
+from misc.journal import (Journal, handler_log, last_session, read_journal, resume_point, session_stamp, training_done,
+                          write_beh, write_triggermap)
+
+HEADER = ['PART_ID', 'Trial', 'Proc_version', 'Exp', 'Key', 'Corr']
+START = 1700000000.0
+
+
+def trial(idx, exp):
+    return dict(row=['P1', idx, 'cmp_freq', exp, 'z', 1])
+
+
+def read_csv(path):
+    with open(path) as csv_file:
+        return list(csv.reader(csv_file))
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / 'journal' / 'P1.jsonl')
+
+
+def crashed_session(journal_path):
+    """
+    Old complete session and new one, which crashed after two training and one experiment trial.
+    """
+    journal = Journal(journal_path)
+    journal.append('session', part_id='P1', start=START - 3600, header=HEADER)
+    journal.append('trial', **trial(1, 'exp'))
+    journal.append('session', part_id='P1', start=START, header=HEADER)
+    for idx in [1, 2]:
+        journal.append('trial', **trial(idx, 'train'))
+        journal.append('trigger', trigger_type='answered', corr=True, key='z', time=0.0)
+    journal.append('trial', **trial(3, 'exp'))
+    journal.append('trigger', trigger_type='answered', corr=True, key='z', time=0.0)
+    journal.append('staircase', idx=3, state=[1, 2], old_rev_count_val={'main': -1})
+    journal.close()
+
+
+def test_torn_last_line_skipped(journal_path):
+    crashed_session(journal_path)
+    n_records = len(read_journal(journal_path))
+    with open(journal_path, 'a') as journal_file:
+        journal_file.write('{"kind": "trial", "row": [')
+    assert len(read_journal(journal_path)) == n_records
+
+
+def test_damaged_inner_line_raises(journal_path):
+    crashed_session(journal_path)
+    with open(journal_path, 'a') as journal_file:
+        journal_file.write('{"kind": \n{"kind": "trial"}\n')
+    with pytest.raises(ValueError):
+        read_journal(journal_path)
+
+
+def test_uncommitted_records_not_on_disk(journal_path):
+    journal = Journal(journal_path)
+    journal.append('session', part_id='P1', start=START, header=HEADER)
+    assert read_journal(journal_path) == []
+    assert journal.commit() == 1
+    assert len(read_journal(journal_path)) == 1
+    journal.close()
+
+
+def test_resume_point(journal_path):
+    crashed_session(journal_path)
+    assert resume_point(journal_path)['idx'] == 3
+    assert training_done(journal_path) == 2
+
+
+def test_resume_compaction(journal_path, tmp_path):
+    crashed_session(journal_path)
+    beh_path = tmp_path / f'P1_{session_stamp(last_session(read_journal(journal_path)))}_beh.csv'
+    write_beh(last_session(read_journal(journal_path)), str(beh_path))  # written when session crashed
+
+    journal = Journal(journal_path)
+    journal.append('resume', start=time.time(), idx=3, trained=2)
+    journal.append('trial', **trial(4, 'exp'))
+    journal.append('trigger', trigger_type='answered', corr=False, key='m', time=0.0)
+    journal.close()
+
+    records = last_session(read_journal(journal_path))
+    assert session_stamp(records) == time.strftime("%Y-%m-%d_%H_%M_%S", time.gmtime(START))
+    assert write_beh(records, str(tmp_path / f'P1_{session_stamp(records)}_beh.csv')) == 4
+    rows = read_csv(beh_path)  # resumed session overwrites file of crashed one
+    assert rows[0] == HEADER
+    assert [(row[1], row[3]) for row in rows[1:]] == [('1', 'train'), ('2', 'train'), ('3', 'exp'), ('4', 'exp')]
+
+    assert write_triggermap(records, str(tmp_path / 'triggermap.csv'), trigger_limit=2) == 4
+    assert [row[0] for row in read_csv(tmp_path / 'triggermap.csv')[1:]] == ['1', '2', '1', '1']
+
+
+def test_triggermap_keeps_sent_values_and_log(tmp_path):
+    from align_triggers import read_triggermap
+
+    records = [dict(kind='session', part_id='P1', start=START, header=HEADER),
+               dict(kind='trigger', trigger_type='stim_1_start', value=59, corr=True, key='z', time=1.5),
+               dict(kind='trigger', trigger_type='answered', value=60, corr=True, key='z', time=2.0),
+               dict(kind='resume', start=START + 60, idx=None, trained=0),
+               dict(kind='trigger', trigger_type='stim_1_start', value=1, corr=False, key='m', time=0.25)]
+    path = str(tmp_path / 'triggermap.csv')
+    crashed_log = ['# 0:00:01.500000  | info     | Value: 59 sent to EEG.']
+    assert write_triggermap(records[:3], path, log=crashed_log) == 2
+    resumed_log = ['# 0:00:00.250000  | info     | Value: 1 sent to EEG.']
+    write_triggermap(records, path, log=handler_log(path) + resumed_log)
+
+    with open(path) as trigger_file:
+        lines = trigger_file.read().splitlines()
+    assert lines[-2:] == crashed_log + resumed_log
+    values, types, sent = read_triggermap(path)
+    assert values == [59, 60, 1] and types == ['stim_1_start', 'answered', 'stim_1_start']
+    assert list(sent) == [1.5, 2.0, 0.25]
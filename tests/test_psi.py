@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from Adaptives.BatchNUpNDownMinIters import PsychometricObserver
+from Adaptives.Psi import Psi
+
+
+def run(psi, observer):
+    levels = list()
+    for level in psi:
+        levels.append(level)
+        psi.set_corr(bool(observer.answer(level)))
+    return levels
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_converges_without_lapses(seed):
+    psi = Psi(levels=range(0, 41), lapse_rate=0, max_iters=60)
+    assert np.isfinite(psi._neg_entropy).all()
+    levels = run(psi, PsychometricObserver(threshold=5, lapse_rate=0, seed=seed))
+    assert len(set(levels)) > 1
+    assert abs(psi.get_estimates()[0] - 5) < 2
+
+
+def test_zero_guess_and_lapse_rates():
+    psi = Psi(levels=range(0, 41), guess_rate=0, lapse_rate=0, max_iters=10)
+    assert np.isfinite(psi._neg_entropy).all()
+    run(psi, PsychometricObserver(threshold=5, guess_rate=0, lapse_rate=0, seed=0))
+    assert np.isfinite(psi.get_estimates()).all()
+
+
+def test_zero_levels_need_threshold_grid():
+    with pytest.raises(AssertionError):
+        Psi(levels=[0, 0])
+    Psi(levels=[0, 0], thresholds=np.linspace(0.1, 10, 50))
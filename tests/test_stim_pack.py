@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from misc.stim_pack import StimPack
+from misc.synth import sine_tone
+
+
+@pytest.fixture
+def tones():
+    return {(freq, 0.5, 44100, 0.05): sine_tone(freq, 0.5, ramp='hann') for freq in [440, 441.5, 1000]}
+
+
+def test_round_trip(tmp_path, tones):
+    path = str(tmp_path / 'stims.pack')
+    StimPack.write(path, tones, ramp_shape='hann')
+    pack = StimPack(path, ramp_shape='hann')
+    assert len(pack) == len(tones) and pack.ramp_shape == 'hann'
+    for (freq, duration, rate, ramp), audio in tones.items():
+        stored = pack.get(freq, duration, rate, ramp)
+        assert np.array_equal(stored, audio)
+        assert not stored.flags.writeable
+
+
+def test_missing_tone(tmp_path, tones):
+    path = str(tmp_path / 'stims.pack')
+    StimPack.write(path, tones, ramp_shape='hann')
+    with pytest.raises(KeyError):
+        StimPack(path).get(500, 0.5, 44100, 0.05)
+
+
+def test_ramp_shape_mismatch(tmp_path, tones):
+    path = str(tmp_path / 'stims.pack')
+    StimPack.write(path, tones, ramp_shape='hann')
+    with pytest.raises(ValueError):
+        StimPack(path, ramp_shape='linear')
+
+
+def test_old_format(tmp_path):
+    path = tmp_path / 'stims.pack'
+    path.write_bytes(b'SFSTPK01' + bytes(64))
+    with pytest.raises(ValueError):
+        StimPack(str(path))
@@ -0,0 +1,37 @@
+import pytest
+
+from Adaptives.MaxIters import MaxIters
+from Adaptives.NUpNDown import NUpNDown
+from Adaptives.NUpNDownMaxIters import NUpNDownMaxIters
+from Adaptives.NUpNDownMinIters import NUpNDownMinIters
+from Adaptives.StoppingRules import MaxTrials
+
+
+def run(staircase):
+    """
+    Alternating answers, so staircase reverses often.
+    :return: No of iterations.
+    """
+    n_trials = 0
+    for n_trials, _ in enumerate(staircase, 1):
+        staircase.set_corr(n_trials % 4 != 0)
+    return n_trials
+
+
+@pytest.mark.parametrize('staircase', [NUpNDown(max_revs=None, stop_rule=MaxTrials(30)),
+                                       NUpNDownMaxIters(max_revs=None, max_iters=30),
+                                       NUpNDownMinIters(max_revs=None, min_iters=5, stop_rule=MaxTrials(30)),
+                                       MaxIters(max_iters=30)])
+def test_no_reversal_limit(staircase):
+    assert staircase.max_revs is None
+    assert run(staircase) == 30
+    assert staircase.revs_count > 8
+
+
+def test_reversal_limit():
+    assert run(NUpNDownMaxIters(max_revs=4, max_iters=30)) < 30
+
+
+def test_no_rule_at_all():
+    with pytest.raises(AssertionError):
+        NUpNDown(max_revs=None)